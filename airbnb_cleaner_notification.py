@@ -1,194 +1,801 @@
 #!/usr/bin/env python
 import datetime
+import functools
 import json
-import os
-import requests
 import sys
-import icalendar
 import argparse
 import logging
+import signal
+import threading
+import time
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("cleaning_detailed.log"),
-        logging.StreamHandler()
-    ]
-)
+import channel_merge
+import cleaner_routing
+import delivery_store
+import event_index
+import feed_cache
+import ical_parser
+import log_pipeline
+import message_composer
+import metrics
+import notification_ledger
+import planner
+import reservation_store
+import scheduler
+import settings
+import sharding
+import snapshot_store
+import sms_dispatcher
+import sms_providers
 
 # Constants
 PROPERTY_LOCATION = "Austin Bell Unit 310"  # Location the cleaner is familiar with
 DEFAULT_RECEIVER = "+14253012277"  # Updated test number
+DEFAULT_CHANGE_WINDOW_DAYS = 7  # Days ahead in which booking changes are reported to the cleaner
+DEFAULT_PLAN_HORIZON = 7  # Days covered by the schedule a reminder run writes with --plan-file
 
 
-def send_sms(phone_number, message):
-    """Send SMS using Twilio API with Account SID and Auth Token authentication."""
-    # Load configuration
-    config = load_config()
-    
-    # Get Twilio credentials
-    account_sid = config.get('TWILIO_ACCOUNT_SID')
-    auth_token = config.get('TWILIO_AUTH_TOKEN')
-    twilio_number = config.get('TWILIO_PHONE_NUMBER')
+def deliver_sms(phone_number, message, config, deliveries=None):
+    """Send one SMS through the configured provider (see sms_providers), raising on failure.
+
+    With STATUS_CALLBACK_URL set, Twilio posts each delivery status change
+    of the message to that URL (the /status endpoint of sms_forward.py).
+    With a DeliveryStore, messages tracked that way are recorded there so
+    their delivery can be followed and, if it fails, re-sent. Returns the
+    provider's SendResult.
+    """
+    provider = sms_providers.get_provider(config)
+    logging.info(f"Sending SMS to {phone_number} via {provider.name}")
+    with metrics.span('sms_send'):
+        result = provider.send(phone_number, message, config.get('STATUS_CALLBACK_URL'))
+    metrics.inc('sms_sent_total', provider=result.provider)
+    if deliveries is not None and result.tracked:
+        deliveries.record_sent(result.sid, phone_number, message, result.status)
     
-    if not account_sid or not auth_token or not twilio_number:
-        logging.error("Error: Twilio credentials not configured in config.json")
-        return False
+    logging.info(f"Successfully sent SMS to {phone_number} via {result.provider}")
+    logging.info(f"Message SID: {result.sid}, Status: {result.status}")
+    return result
+
+
+def send_sms(phone_number, message, config=None):
+    """Send SMS through the configured provider, returning whether it was accepted."""
+    # Load configuration unless the caller already has it
+    if config is None:
+        config = settings.get_settings()
     
     try:
-        # Import Twilio client
-        from twilio.rest import Client
-        
-        # Create Twilio client using Account SID and Auth Token authentication
-        client = Client(account_sid, auth_token)
-        
-        # Send message
-        logging.info(f"Sending SMS to {phone_number} via Twilio")
-        message_obj = client.messages.create(
-            body=message,
-            from_=twilio_number,
-            to=phone_number
-        )
-        
-        logging.info(f"Successfully sent SMS to {phone_number}")
-        logging.info(f"Message SID: {message_obj.sid}, Status: {message_obj.status}")
+        deliver_sms(phone_number, message, config)
         return True
-    except ImportError:
-        logging.error("Twilio library not installed. Installing now...")
-        os.system("pip install twilio")
-        return send_sms(phone_number, message)  # Retry after installation
+    except ImportError as e:
+        # Fail fast: installing packages mid-run would stall every message behind pip
+        logging.error(f"SMS provider library not installed ({e}); run: pip install -r requirements.txt")
+        return False
     except Exception as e:
         logging.error(f"Error sending SMS: {e}")
         return False
 
 
-def load_config():
-    """Load configuration from config.json file."""
-    try:
-        with open('config.json', 'r') as f:
-            config = json.load(f)
-            # Mask sensitive information in logs
-            masked_config = {k: '***' if k in ['D7_API_TOKEN', 'TWILIO_AUTH_TOKEN'] else v for k, v in config.items()}
-            logging.info(f"Loaded configuration: {json.dumps(masked_config)}")
-            return config
-    except Exception as e:
-        logging.error(f"Error loading config: {e}")
-        return {}
+def get_listings(config):
+    """Return the list of listings to check.
+
+    Multi-listing mode is enabled by a LISTINGS array in config.json, where each
+    entry may set ICAL_URL, ICAL_URLS (the feeds of the same property on
+    other channels, such as VRBO or Booking.com), PROPERTY_LOCATION,
+    CLEANER_PHONE, TIMEZONE, NOTIFY_TIME and AREA (the location group used to
+    route jobs to cleaners, default PROPERTY_LOCATION). Missing values fall
+    back to the top-level settings. Without LISTINGS, the top-level settings
+    describe a single listing.
+
+    NAME (default PROPERTY_LOCATION) keys a listing's reminders, snapshots
+    and stored reservations, so a ValueError is raised if two listings
+    share one.
+    """
+    defaults = {
+        'ICAL_URL': config.ical_url,
+        'ICAL_URLS': config.get('ICAL_URLS', []),
+        'PROPERTY_LOCATION': config.get('PROPERTY_LOCATION', PROPERTY_LOCATION),
+        'CLEANER_PHONE': config.get('CLEANER_PHONE', DEFAULT_RECEIVER),
+        'TIMEZONE': config.get('TIMEZONE', scheduler.DEFAULT_TIMEZONE),
+        'NOTIFY_TIME': config.get('NOTIFY_TIME', scheduler.DEFAULT_NOTIFY_TIME),
+    }
+
+    entries = config.listings or [{}]
+    listings = []
+    names = set()
+    for entry in entries:
+        listing = dict(defaults)
+        listing.update({k: v for k, v in entry.items() if v is not None})
+        if entry.get('ICAL_URL') and 'ICAL_URLS' not in entry:
+            listing['ICAL_URLS'] = []  # Another property's channels must not be inherited
+        listing.setdefault('NAME', listing['PROPERTY_LOCATION'])
+        listing.setdefault('AREA', listing['PROPERTY_LOCATION'])
+        if listing['NAME'] in names:
+            raise ValueError(f"Listing NAME {listing['NAME']!r} is used more than once in LISTINGS; "
+                             f"give each listing a unique NAME")
+        names.add(listing['NAME'])
+        listings.append(listing)
+    return listings
+
+
+def record_outcome(ledger, key, result):
+    """Record a send result in the ledger; result is a bool or a Future resolving to one."""
+    if hasattr(result, 'add_done_callback'):
+        result.add_done_callback(lambda future: ledger.record(key, not future.exception() and future.result()))
+    else:
+        ledger.record(key, result)
+
+
+def notify_cleaner(cleaner_phone, turnovers, send=send_sms, ledger=None):
+    """Send a cleaner one consolidated reminder for their turnovers on each checkout day.
+
+    Messages are handed to send(phone_number, message), which is normally an
+    Outbox's add so that everything for the same cleaner in a run is sent
+    together. With a ledger, turnovers already reminded for this listing,
+    date and cleaner are left out, and nothing is sent if none remain.
+    """
+    by_day = {}
+    for turnover in turnovers:
+        by_day.setdefault(turnover.checkout, []).append(turnover)
+
+    for tomorrow, jobs in by_day.items():
+        keys = []
+        if ledger is not None:
+            pending = []
+            for turnover in jobs:
+                key = ledger.make_key(turnover.listing, tomorrow, cleaner_phone)
+                if ledger.claim(key):
+                    pending.append(turnover)
+                    keys.append(key)
+                else:
+                    logging.info(f"Reminder for {turnover.listing} on {tomorrow} already sent to {cleaner_phone}, skipping",
+                                 extra={'listing': turnover.listing})
+            jobs = pending
+        if not jobs:
+            continue
+
+        for turnover in jobs:
+            metrics.inc('notifications_total', listing=turnover.listing)
+        # Send SMS
+        result = send(cleaner_phone, message_composer.compose_reminder(jobs, tomorrow))
+        for key in keys:
+            record_outcome(ledger, key, result)
+
+
+def change_messages(listing, diff, today, window_days):
+    """Return the messages telling the cleaner about new, cancelled and rescheduled checkouts in the next window_days.
+
+    Only the delta since the previous snapshot is examined. Checkouts
+    tomorrow are left to the regular reminder. The messages are for the
+    listing's CLEANER_PHONE.
+    """
+    property_location = listing['PROPERTY_LOCATION']
+    tomorrow = today + datetime.timedelta(days=1)
+    last_day = today + datetime.timedelta(days=window_days)
+
+    def upcoming(row):
+        return tomorrow < snapshot_store.row_date(row[2]) <= last_day
+
+    def day(row):
+        return message_composer.short_day(snapshot_store.row_date(row[2]))
+
+    messages = []
+    for row in diff.added:
+        if upcoming(row):
+            messages.append(message_composer.NEW_BOOKING(location=property_location, day=day(row)))
+    for row in diff.removed:
+        if upcoming(row):
+            messages.append(message_composer.CANCELLED(location=property_location, day=day(row)))
+    for old, new in diff.modified:
+        if old[2] != new[2] and (upcoming(old) or upcoming(new)):
+            messages.append(message_composer.MOVED(location=property_location, old_day=day(old), new_day=day(new)))
+
+    return messages
+
+
+def was_sent(result):
+    """True if a send result (a bool or a Future resolving to one) reports success."""
+    if hasattr(result, 'add_done_callback'):
+        return not result.exception() and result.result()
+    return result
+
+
+def channel_urls(listing):
+    """Return the iCal URLs of every channel a listing is on, its ICAL_URL first."""
+    return list(dict.fromkeys([listing['ICAL_URL']] + list(listing['ICAL_URLS'])))
+
+
+def select_listings(config, names=None):
+    """Return the configured listings that can be checked, optionally limited to names."""
+    listings = []
+    for listing in get_listings(config):
+        if names is not None and listing['NAME'] not in names:
+            continue
+        if not listing['CLEANER_PHONE']:
+            logging.error(f"Error: Cleaner's phone number not configured for {listing['NAME']}")
+        elif not listing['ICAL_URL']:
+            logging.error(f"Error: iCal URL not configured for {listing['NAME']}")
+        else:
+            listings.append(listing)
+    
+    if not listings:
+        logging.error("Error: No listings configured in config.json")
+    return listings
+
+
+def fetch_listing_feeds(config, listings):
+    """Download and parse the feeds of every listing and channel concurrently, revalidating cached copies.
+
+    Failing downloads are retried and, if they still fail, served from a
+    recent enough cached copy.
+
+    Returns a dict mapping each iCal URL to its FeedResult (None on failure).
+    """
+    import feed_fetcher  # Loads requests, so only runs that download feeds pay for it
+
+    return feed_fetcher.fetch_feeds(
+        [url for listing in listings for url in channel_urls(listing)],
+        max_workers=config.get('MAX_CONCURRENT_FETCHES', feed_fetcher.DEFAULT_MAX_CONCURRENT_FETCHES),
+        per_host_concurrency=config.get('PER_HOST_CONCURRENCY', feed_fetcher.DEFAULT_PER_HOST_CONCURRENCY),
+        per_host_interval=config.get('PER_HOST_INTERVAL', feed_fetcher.DEFAULT_PER_HOST_INTERVAL),
+        cache=feed_cache.load_feed_cache(config),
+        parse=functools.partial(ical_parser.parse_events, fast=config.get('ICAL_FAST_PARSER', True)),
+        policy=feed_fetcher.load_fetch_policy(config),
+        breaker=feed_fetcher.load_circuit_breaker(config),
+    )
+
+
+def listing_index(listing, feeds, store):
+    """Build a listing's EventIndex from its channel feeds, falling back to the stored reservations.
+
+    feeds holds the FeedResult (None if it failed) of each channel URL.
+    Feed dates are normalized to local dates in the listing's TIMEZONE and
+    the channels are merged into one timeline (see channel_merge). If a
+    channel failed, the stored reservations, which hold the last complete
+    timeline, are merged in place of it. Returns None if nothing is available.
+    """
+    tz = event_index.get_timezone(listing['TIMEZONE'])
+    indexes = [event_index.EventIndex.from_events(feed.events, tz) for feed in feeds if feed is not None]
+    if len(indexes) < len(feeds):
+        metrics.inc('listing_failures_total', listing=listing['NAME'])
+        if store.has_listing(listing['NAME']):
+            logging.warning(f"Feed for {listing['NAME']} unavailable, using stored reservations")
+            metrics.inc('reservation_store_fallbacks_total', listing=listing['NAME'])
+            indexes.append(store.index(listing['NAME']))
+    if not indexes:
+        return None
+    return channel_merge.merge_indexes(listing['NAME'], indexes)
+
+
+def find_turnovers(indexes, now, today=None):
+    """Return tomorrow's turnovers of (listing, EventIndex) pairs.
+
+    "Tomorrow" is the day after today, or after the date at now in each
+    listing's TIMEZONE.
+    """
+    turnovers = []
+    for listing, index in indexes:
+        tomorrow = (today or event_index.local_today(listing['TIMEZONE'], now)) + datetime.timedelta(days=1)
+        with metrics.span('evaluate', listing=listing['NAME']):
+            found = planner.plan_listing(listing, index, tomorrow, 1)
+        metrics.inc('checkouts_total', len(found), listing=listing['NAME'])
+        if found:
+            logging.info(f"Found checkout tomorrow ({tomorrow}) at {listing['PROPERTY_LOCATION']}",
+                         extra={'listing': listing['NAME']})
+            turnovers.extend(found)
+        else:
+            logging.info(f"No events ending tomorrow at {listing['NAME']}.", extra={'listing': listing['NAME']})
+    return turnovers
+
+
+def notify_turnovers(config, listings, turnovers, send=send_sms, ledger=None, reminded=None):
+    """Route turnovers to cleaners and hand each cleaner's reminder to send.
+
+    reminded is passed to cleaner_routing.route so the jobs earlier runs
+    gave a cleaner for the same day count against their CAPACITY.
+    Turnovers no cleaner can take are reported to PERSONAL_PHONE, with a
+    ledger only once per listing and day. Returns the unassigned turnovers.
+    """
+    with metrics.span('assign'):
+        cleaners, unassigned = cleaner_routing.route(config, listings, turnovers, reminded)
+    for cleaner in cleaners:
+        if cleaner.jobs:
+            notify_cleaner(cleaner.phone, cleaner.jobs, send=send, ledger=ledger)
+    
+    unassigned_by_day = {}
+    for turnover in unassigned:
+        metrics.inc('unassigned_turnovers_total', listing=turnover.listing)
+        unassigned_by_day.setdefault(turnover.checkout, []).append(turnover)
+    for day, jobs in unassigned_by_day.items():
+        logging.error(f"No cleaner available tomorrow ({day}) for: {', '.join(job.location for job in jobs)}")
+        if not config.personal_phone:
+            continue
+        # Like the reminders, each turnover is only reported once, however often the check runs
+        keys = []
+        if ledger is not None:
+            pending = []
+            for job in jobs:
+                key = ledger.make_key(job.listing, day, config.personal_phone)
+                if ledger.claim(key):
+                    pending.append(job)
+                    keys.append(key)
+            jobs = pending
+        if jobs:
+            result = send(config.personal_phone, message_composer.UNASSIGNED(
+                day=message_composer.short_day(day), locations=', '.join(job.location for job in jobs)))
+            for key in keys:
+                record_outcome(ledger, key, result)
+    return unassigned
+
+
+def evaluate_listings(config, listings, indexes, now, today=None, send=send_sms, ledger=None):
+    """Find tomorrow's turnovers, route them to cleaners and hand each cleaner's reminder to send.
+
+    This is the evaluation step of a reminder run, shared with the replay
+    engine; see find_turnovers and notify_turnovers. Returns (turnovers,
+    unassigned turnovers).
+    """
+    turnovers = find_turnovers(indexes, now, today)
+    return turnovers, notify_turnovers(config, listings, turnovers, send=send, ledger=ledger)
+
+
+class Scan:
+    """What checking a set of listings found, before anything is sent.
+
+    A shard returns its Scan to the coordinator, which merges them and
+    notifies once for all listings, so it only holds picklable values.
+    """
+
+    __slots__ = ('listings', 'turnovers', 'changes', 'snapshots', 'plan')
+
+    def __init__(self, listings=()):
+        self.listings = list(listings)  # The listings checked
+        self.turnovers = []  # planner.Turnover checking out tomorrow
+        self.changes = []  # (listing name, phone number, message) booking change alerts
+        self.snapshots = []  # (listing name, snapshot rows) to save once its change alerts are sent
+        self.plan = []  # planner.Turnover in the next horizon days, if a plan was asked for
+
+    def extend(self, other):
+        self.listings.extend(other.listings)
+        self.turnovers.extend(other.turnovers)
+        self.changes.extend(other.changes)
+        self.snapshots.extend(other.snapshots)
+        self.plan.extend(other.plan)
+
+
+def scan_listings(config, listings, now, today=None, dry_run=False, horizon=None):
+    """Download the listings' feeds and find tomorrow's turnovers and the booking changes, without sending anything.
+
+    All listing feeds are downloaded concurrently, so the total runtime is
+    roughly that of the slowest feed. New feed contents are stored in the
+    reservation database, which stands in for a feed that cannot be
+    downloaded, and each feed is diffed against the previous run's
+    snapshot; the new snapshot is only saved by send_notifications. With
+    a horizon, the turnovers of the next horizon days are planned from the
+    same parsed feeds. Returns a Scan.
+    """
+    logging.info(f"Checking {len(listings)} listing(s) for events ending tomorrow")
+    scan = Scan(listings)
+    
+    # Download every feed concurrently
+    feeds = fetch_listing_feeds(config, listings)
+    
+    # Compare each feed with the events seen on the previous run
+    snapshots = snapshot_store.SnapshotStore(config.get('SNAPSHOT_DIR', snapshot_store.DEFAULT_SNAPSHOT_DIR))
+    
+    indexes = []
+    with reservation_store.load_reservation_store(config) as store:
+        for listing in listings:
+            channel_feeds = [feeds.get(url) for url in channel_urls(listing)]
+            listing_today = today or event_index.local_today(listing['TIMEZONE'], now)
+            try:
+                index = listing_index(listing, channel_feeds, store)
+                if index is None:
+                    continue
+                indexes.append((listing, index))
+                
+                # Only a complete timeline is stored or diffed, and unchanged
+                # (304 or cached) feeds cannot have changed since the last run
+                if any(feed is None for feed in channel_feeds):
+                    continue
+                from_cache = all(feed.from_cache for feed in channel_feeds)
+                if not dry_run and (not from_cache or not store.has_listing(listing['NAME'])):
+                    store.sync(listing['NAME'], index.by_start, listing_today)
+                if from_cache and snapshots.has_snapshot(listing['NAME']):
+                    continue
+                diff = snapshots.update(listing['NAME'], index.by_start, persist=False)
+                if diff and not diff.initial:
+                    logging.info(f"Calendar changes at {listing['NAME']}: {diff.summary()}",
+                                 extra={'listing': listing['NAME']})
+                    if config.get('NOTIFY_CHANGES', False):
+                        for message in change_messages(listing, diff, listing_today,
+                                                       config.get('CHANGE_WINDOW_DAYS', DEFAULT_CHANGE_WINDOW_DAYS)):
+                            scan.changes.append((listing['NAME'], listing['CLEANER_PHONE'], message))
+                if diff or not snapshots.has_snapshot(listing['NAME']):
+                    scan.snapshots.append((listing['NAME'], snapshot_store.to_rows(index.by_start)))
+            except Exception as e:
+                logging.error(f"Error checking for events at {listing['NAME']}: {e}")
+    
+    scan.turnovers = find_turnovers(indexes, now, today)
+    if horizon:
+        with metrics.span('plan'):
+            scan.plan = plan_indexes(indexes, horizon, now, today)
+    return scan
+
 
+def send_notifications(config, scan, dry_run=False):
+    """Send the reminders and booking change alerts of a Scan.
 
-def check_checkout_tomorrow(dry_run=False):
-    """Checks for events ending tomorrow and notifies cleaner.
+    The turnovers are assigned to cleaners (see cleaner_routing), and every
+    message for the same recipient is coalesced by an Outbox into as few
+    SMS segments as possible, then sent on a throttled dispatcher so they
+    go out concurrently. The ledger makes sure no reminder is sent twice.
+    A listing's snapshot is saved once its change alerts were sent;
+    otherwise the next run reports the changes again. Returns a dict
+    counting the listings, turnovers, unassigned turnovers and SMS messages.
+    """
+    snapshots = snapshot_store.SnapshotStore(config.get('SNAPSHOT_DIR', snapshot_store.DEFAULT_SNAPSHOT_DIR))
+    outbox = message_composer.Outbox(config.get('SMS_MAX_SEGMENTS', message_composer.DEFAULT_MAX_SEGMENTS))
+    results = {}  # Listing name -> results of its change alerts
+    with notification_ledger.NotificationLedger(
+                config.get('LEDGER_FILE', notification_ledger.DEFAULT_LEDGER_FILE)) as ledger, \
+            delivery_store.load_delivery_store(config) as deliveries, \
+            sms_dispatcher.create_dispatcher(
+                config, lambda phone_number, message: deliver_sms(phone_number, message, config, deliveries)) as dispatcher:
+        for name, phone_number, message in scan.changes:
+            results.setdefault(name, []).append(outbox.add(phone_number, message))
+        
+        unassigned = notify_turnovers(config, scan.listings, scan.turnovers, send=outbox.add,
+                                      ledger=None if dry_run else ledger, reminded=ledger.reminded)
+        
+        queued = len(outbox)
+        sent = outbox.flush(None if dry_run else dispatcher.submit)
+        if queued:
+            logging.info(f"Coalesced {queued} notification(s) into {sent} SMS")
+    
+    # The dispatcher has finished, so every change alert has its outcome
+    for name, rows in scan.snapshots:
+        if dry_run:
+            snapshots.mark_stale(name)
+        elif all(was_sent(result) for result in results.get(name, ())):
+            snapshots.save(name, rows)
+        else:
+            logging.warning(f"Change notifications for {name} were not sent; they will be retried on the next run",
+                            extra={'listing': name})
+            snapshots.mark_stale(name)
+    
+    return {'listings': len(scan.listings), 'turnovers': len(scan.turnovers), 'unassigned': len(unassigned),
+            'messages': sent}
+
+
+def check_checkout_tomorrow(dry_run=False, names=None, today=None, shard=None, clock=scheduler.SYSTEM_CLOCK,
+                            horizon=None):
+    """Checks every configured listing for events ending tomorrow and notifies cleaners.
     
     Assumptions:
     - In Airbnb's iCal format, DTEND is the date the guest checks out
     - DTSTART is the date the guest checks in
-    - We directly use these dates without additional processing
+    - Dates with a time of day are converted to the listing's TIMEZONE
+    
+    "Tomorrow" is the day after the current date in each listing's
+    TIMEZONE, so a server running in UTC notifies about the right day.
+    
+    The listings are checked by scan_listings, then the reminders and
+    booking change alerts are sent by send_notifications.
     
     Args:
-        dry_run: If True, don't actually send SMS, just print what would be sent
+        dry_run: If True, don't actually send SMS, just print what would be
+            sent, and leave the reservation database and snapshots as they are
+        names: If given, only check the listings with these names
+        today: Date to treat as today for every listing (defaults to the
+            current date in each listing's TIMEZONE)
+        shard: If given, a sharding.Shard; only its listings are checked, using
+            its own cache and reservation database
+        clock: Source of the current time (a scheduler.SystemClock or
+            SimulatedClock)
+        horizon: If given, also plan every turnover in the next horizon days
+            from the feeds parsed for this run (see plan_cleanings)
+    
+    Returns:
+        A dict counting the listings, turnovers, unassigned turnovers and SMS
+        messages of this run (empty if there was nothing to check), with the
+        planned turnovers under 'plan' if horizon was given
     """
     # Load configuration
-    config = load_config()
-    
-    # Get cleaner's phone number (use default if not configured)
-    cleaner_phone = config.get('CLEANER_PHONE', DEFAULT_RECEIVER)
+    config = settings.get_settings()
+    scan_config = shard.settings(config) if shard is not None else config
     
-    if not cleaner_phone:
-        logging.error("Error: Cleaner's phone number not configured in config.json")
-        return
-    
-    # Get iCal URL
-    ical_url = config.get('ICAL_URL')
+    # Get the listings to check
+    listings = select_listings(config, names)
+    if shard is not None:
+        listings = shard.select(listings)
+        logging.info(f"Shard {shard} owns {len(listings)} listing(s)")
+    if not listings:
+        return {}
     
-    if not ical_url:
-        logging.error("Error: iCal URL not configured in config.json")
-        return
+    # Tomorrow is worked out per listing in its own timezone unless today is given
+    scan = scan_listings(scan_config, listings, clock.now(), today=today, dry_run=dry_run, horizon=horizon)
+    summary = send_notifications(config, scan, dry_run=dry_run)
+    if horizon:
+        summary['plan'] = scan.plan
+    return summary
+
+
+def resend_undelivered(hours, dry_run=False):
+    """Send again the messages of the last hours that did not reach their recipient.
+
+    Delivery is known from the Twilio status callbacks recorded in the
+    delivery database (see delivery_store). Messages reported as failed or
+    undelivered, or still queued after DELIVERY_STUCK_MINUTES, are re-sent
+    once. Returns the number of messages re-sent.
+    """
+    config = settings.get_settings()
+    resent = 0
+    with delivery_store.load_delivery_store(config) as deliveries:
+        pending = deliveries.undelivered(
+            time.time() - hours * 3600,
+            config.get('DELIVERY_STUCK_MINUTES', delivery_store.DEFAULT_STUCK_MINUTES))
+        for message in pending:
+            if not message['body'] or not message['phone']:
+                continue
+            reason = message['status'] + (f" (error {message['error_code']})" if message['error_code'] else "")
+            if dry_run:
+                logging.info(f"[DRY RUN] Would re-send {message['sid']} to {message['phone']}, {reason}")
+                continue
+            logging.info(f"Re-sending {message['sid']} to {message['phone']}, {reason}")
+            try:
+                result = deliver_sms(message['phone'], message['body'], config, deliveries)
+            except Exception as e:
+                logging.error(f"Error re-sending {message['sid']} to {message['phone']}: {e}")
+                continue
+            deliveries.mark_resent(message['sid'], result.sid)
+            metrics.inc('sms_resent_total')
+            resent += 1
+    logging.info(f"Re-sent {resent} of {len(pending)} undelivered message(s)")
+    return resent
+
+
+def plan_indexes(indexes, horizon, now, today=None):
+    """Plan the next horizon days of (listing, EventIndex) pairs, each starting tomorrow in its own timezone."""
+    return planner.plan_fleet(
+        [(listing, index, (today or event_index.local_today(listing['TIMEZONE'], now)) + datetime.timedelta(days=1))
+         for listing, index in indexes],
+        horizon)
+
+
+def plan_cleanings(horizon, today=None):
+    """Compute every turnover in the next horizon days for all listings.
+
+    Each feed is downloaded and parsed once for the whole horizon, instead
+    of once per day. A reminder run can produce the same plan from the
+    feeds it already parsed with check_checkout_tomorrow(horizon=...).
+    Returns a list of planner.Turnover sorted by date.
+    """
+    config = settings.get_settings()
+    listings = select_listings(config)
+    if not listings:
+        return []
     
-    # Get property location
-    property_location = config.get('PROPERTY_LOCATION', PROPERTY_LOCATION)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    logging.info(f"Planning cleanings for {len(listings)} listing(s) over the next {horizon} day(s)")
     
-    # Get tomorrow's date
-    tomorrow = datetime.date.today() + datetime.timedelta(days=1)
-    logging.info(f"Checking for events ending tomorrow ({tomorrow})")
+    feeds = fetch_listing_feeds(config, listings)
+    indexes = []
+    with reservation_store.load_reservation_store(config) as store:
+        for listing in listings:
+            index = listing_index(listing, [feeds.get(url) for url in channel_urls(listing)], store)
+            if index is not None:
+                indexes.append((listing, index))
     
+    with metrics.span('plan'):
+        return plan_indexes(indexes, horizon, now, today)
+
+
+def write_plan(turnovers, path, fmt):
+    """Write a cleaning schedule to path, or to stdout if path is None."""
+    output = open(path, 'w', newline='') if path else sys.stdout
     try:
-        # Download iCal data
-        logging.info(f"Downloading iCal data from: {ical_url}")
-        response = requests.get(ical_url, verify=False)  # Note: verify=False is not recommended for production
-        
-        if response.status_code != 200:
-            logging.error(f"Failed to download iCal data. Status code: {response.status_code}")
-            return
-        
-        # Parse iCal data
-        cal = icalendar.Calendar.from_ical(response.text)
-        
-        # Check for events ending tomorrow
-        found_event = False
-        next_checkin_date = None
-        
-        # First, find the next check-in after tomorrow
-        for component in cal.walk():
-            if component.name == "VEVENT":
-                start_date = component.get('dtstart').dt
-                if isinstance(start_date, datetime.datetime):
-                    start_date = start_date.date()
-                
-                if start_date > tomorrow and (next_checkin_date is None or start_date < next_checkin_date):
-                    next_checkin_date = start_date
-        
-        # Now check for events ending tomorrow
-        for component in cal.walk():
-            if component.name == "VEVENT":
-                end_date = component.get('dtend').dt
-                if isinstance(end_date, datetime.datetime):
-                    end_date = end_date.date()
-                
-                if end_date == tomorrow:
-                    found_event = True
-                    summary = component.get('summary')
-                    logging.info(f"Found event ending tomorrow: {summary}, End date: {end_date}")
-                    
-                    # Format the message
-                    tomorrow_day = tomorrow.strftime("%A, %B %d, %Y")
-                    
-                    message = f"Cleaning needed tomorrow ({tomorrow_day}) at {property_location}."
-                    
-                    if next_checkin_date:
-                        days_until_checkin = (next_checkin_date - tomorrow).days
-                        next_checkin_day = next_checkin_date.strftime("%A, %B %d")
-                        
-                        if days_until_checkin == 1:
-                            message += f" Next check-in is the day after tomorrow ({next_checkin_day})."
-                        else:
-                            message += f" Next check-in is in {days_until_checkin} days ({next_checkin_day})."
-                    
-                    if dry_run:
-                        logging.info(f"[DRY RUN] Would send SMS: {message}")
-                    else:
-                        # Send SMS
-                        send_sms(cleaner_phone, message)
-        
-        if not found_event:
-            logging.info("No events ending tomorrow.")
+        planner.write_turnovers(turnovers, output, fmt)
+    finally:
+        if path:
+            output.close()
+
+
+def run_shard(index, count, now, dry_run=False, horizon=None):
+    """Check one shard's listings in a worker process and return its Scan and metrics."""
+    metrics.METRICS.reset()
+    shard = sharding.Shard(index, count)
+    config = shard.settings(settings.get_settings())
+    listings = shard.select(select_listings(config))
+    logging.info(f"Shard {shard} owns {len(listings)} listing(s)")
+    scan = scan_listings(config, listings, now, dry_run=dry_run, horizon=horizon) if listings else Scan()
+    return scan, metrics.METRICS.to_dict()
+
+
+def run_shards(count, dry_run=False, horizon=None, clock=scheduler.SYSTEM_CLOCK):
+    """Check all listings split into count shards running in parallel processes.
+
+    The shards download and evaluate their listings; this process is the
+    coordinator, which merges what they found and sends the notifications
+    once for all listings, so routing to CLEANERS sees every turnover and
+    each cleaner still gets a single message. It also merges the shards'
+    metrics into this process's registry. The shards send their log
+    records to this process, which writes them all to the one log file.
+    Returns the summary of send_notifications, with the plan under 'plan'
+    if horizon was given.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    config = settings.get_settings()
+    now = clock.now()
+    scan = Scan()
+    log_queue = multiprocessing.Queue()
+    listener = log_pipeline.listen(log_queue)
+    with ProcessPoolExecutor(max_workers=count, initializer=log_pipeline.forward,
+                             initargs=(log_queue, config.get('LOG_SAMPLE_RATE', 1.0))) as executor:
+        futures = [executor.submit(run_shard, index, count, now, dry_run, horizon) for index in range(count)]
+        for index, future in enumerate(futures):
+            try:
+                shard_scan, shard_metrics = future.result()
+            except Exception as e:
+                logging.error(f"Shard {index}/{count} failed: {e}")
+                metrics.inc('shard_failures_total')
+                continue
+            metrics.METRICS.merge(shard_metrics)
+            scan.extend(shard_scan)
+    if listener is not None:
+        listener.stop()
     
-    except Exception as e:
-        logging.error(f"Error checking for events: {e}")
+    # Route in config order, as an unsharded run does, so cleaners get the same jobs whatever the shard count
+    order = {listing['NAME']: position for position, listing in enumerate(select_listings(config))}
+    scan.listings.sort(key=lambda listing: order[listing['NAME']])
+    scan.turnovers.sort(key=lambda turnover: order[turnover.listing])
+    summary = send_notifications(config, scan, dry_run=dry_run)
+    logging.info(f"Finished {count} shard(s): " + ", ".join(f"{value} {key}" for key, value in summary.items()))
+    if horizon:
+        scan.plan.sort(key=lambda turnover: (turnover.checkout, turnover.listing))
+        summary['plan'] = scan.plan
+    return summary
 
 
-def main():
-    """Main function to run the script."""
-    # Parse command line arguments
-    parser = argparse.ArgumentParser(description='Airbnb Cleaner Notification')
-    parser.add_argument('--dry-run', action='store_true', help='Do not send SMS, just print what would be sent')
-    parser.add_argument('--test-sms', action='store_true', help='Send a test SMS to the cleaner')
-    args = parser.parse_args()
+def check_shard_cleaners(config, count):
+    """Exit if a cleaner in CLEANERS serves listings in more than one of count shards run separately.
+
+    Shards run with --shard (or a sharded daemon) route their turnovers on
+    their own, so such a cleaner could get more jobs than their CAPACITY
+    and one message per shard. --shards runs route in the coordinator and
+    need no such check.
+    """
+    cleaners = cleaner_routing.load_cleaners(config)
+    if not cleaners or count == 1:
+        return
+    split = sharding.split_cleaners(cleaners, get_listings(config), count)
+    if split:
+        logging.error(f"CLEANERS {', '.join(cleaner.name for cleaner in split)} serve areas in more than one of "
+                      f"{count} shards; give them AREAS handled by one shard, or use --shards {count}")
+        sys.exit(1)
+
+
+def run_daemon(dry_run=False, metrics_file=None, shard=None):
+    """Run as a resident process that checks each listing at its local notification time.
+
+    Each listing is scheduled at NOTIFY_TIME in its own TIMEZONE on an internal
+    timer queue, so the local time stays fixed across DST changes. The HTTP
+    session stays warm between runs, config.json is checked for changes on
+    every wake-up to pick up new or removed listings, and next fire times are
+    persisted so a restart resumes the schedule. With metrics_file, the
+    cumulative metrics are exported after every run. With a shard, only
+    that shard's listings are scheduled.
+    """
+    config = settings.get_settings()
+    if shard is not None:
+        check_shard_cleaners(config, shard.count)
+        config = shard.settings(config)
+    timers = scheduler.Scheduler(config.get('SCHEDULER_STATE_FILE', scheduler.DEFAULT_STATE_FILE))
+    stop = threading.Event()
+
+    def handle_signal(signum, frame):
+        logging.info(f"Received signal {signum}, stopping daemon")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    # Keep the connection pool and SMS client warm for the lifetime of the process
+    import feed_fetcher
+    feed_fetcher.get_session()
+    try:
+        sms_providers.get_provider(config)
+    except ValueError as e:
+        logging.error(f"{e}; SMS sending will fail")
+    if config.twilio_account_sid and config.twilio_auth_token:
+        try:
+            sms_dispatcher.get_twilio_client(config.twilio_account_sid, config.twilio_auth_token)
+        except ImportError:
+            logging.error("Twilio library not installed; SMS sending will fail")
+
+    logging.info("Airbnb cleaner notification daemon started")
+    while not stop.is_set():
+        now = datetime.datetime.now(datetime.timezone.utc)
+        try:
+            listings = get_listings(settings.get_settings())
+        except ValueError as e:
+            # Keep the current schedule until config.json is fixed
+            logging.error(f"Invalid configuration: {e}")
+            stop.wait(60.0)
+            continue
+        if shard is not None:
+            listings = shard.select(listings)
+        listings = {listing['NAME']: listing for listing in listings}
+
+        # Schedule new listings and forget removed ones
+        for name, listing in listings.items():
+            if name not in timers:
+                fire_at = scheduler.next_fire_time(now, listing['TIMEZONE'], listing['NOTIFY_TIME'])
+                logging.info(f"Scheduling {name} at {fire_at.astimezone(event_index.get_timezone(listing['TIMEZONE']))}",
+                             extra={'listing': name})
+                timers.schedule(name, fire_at)
+        for name in timers.keys():
+            if name not in listings:
+                timers.remove(name)
+
+        # Run the checks that are due in one pass, so their turnovers are routed together and
+        # each cleaner gets one message; "tomorrow" is still worked out in each listing's timezone
+        due = [name for name in timers.pop_due(now) if name in listings]
+        if due:
+            try:
+                check_checkout_tomorrow(dry_run=dry_run, names=set(due), shard=shard)
+            except Exception as e:
+                logging.error(f"Error running scheduled check for {', '.join(due)}: {e}")
+            finally:
+                for name in due:
+                    listing = listings[name]
+                    timers.schedule(name, scheduler.next_fire_time(now, listing['TIMEZONE'], listing['NOTIFY_TIME']))
+                if metrics_file:
+                    metrics.METRICS.export(metrics_file)
+
+        # Sleep until the next check, waking at least once a minute to pick up config changes
+        next_fire = timers.next_fire()
+        wait = 60.0
+        if next_fire is not None:
+            wait = min(wait, max(0.0, (next_fire - datetime.datetime.now(datetime.timezone.utc)).total_seconds()))
+        stop.wait(wait)
+
+    logging.info("Airbnb cleaner notification daemon stopped")
+
+
+def run(args):
+    """Run the mode selected on the command line."""
+    # A reminder run with --plan-file also plans ahead from the feeds it parses
+    horizon = (args.horizon or DEFAULT_PLAN_HORIZON) if args.plan_file else None
+    if not args.merge_metrics:
+        try:
+            get_listings(settings.get_settings())
+        except ValueError as e:
+            logging.error(f"Invalid configuration: {e}")
+            sys.exit(1)
     
-    if args.test_sms:
+    if args.daemon:
+        run_daemon(dry_run=args.dry_run, metrics_file=args.metrics_file, shard=args.shard)
+    elif args.merge_metrics:
+        # Combine the metrics files written by shards on other hosts
+        for path in args.merge_metrics:
+            with open(path, 'r') as f:
+                metrics.METRICS.merge(json.load(f))
+        if not args.metrics_file:
+            print(metrics.METRICS.to_prometheus(), end='')
+    elif args.resend_undelivered:
+        resend_undelivered(args.resend_undelivered, dry_run=args.dry_run)
+    elif args.shards:
+        summary = run_shards(args.shards, dry_run=args.dry_run, horizon=horizon)
+        if args.plan_file:
+            write_plan(summary.get('plan', []), args.plan_file, args.format)
+    elif args.horizon and not args.plan_file:
+        # Print the cleaning schedule instead of sending reminders
+        write_plan(plan_cleanings(args.horizon), args.output, args.format)
+    elif args.test_sms:
         # Get cleaner's phone number
-        config = load_config()
+        config = settings.get_settings()
         cleaner_phone = config.get('CLEANER_PHONE', DEFAULT_RECEIVER)
         
         if not cleaner_phone:
@@ -200,7 +807,51 @@ def main():
         logging.info("Test SMS sent successfully")
     else:
         # Check for events ending tomorrow
-        check_checkout_tomorrow(dry_run=args.dry_run)
+        if args.shard is not None:
+            check_shard_cleaners(settings.get_settings(), args.shard.count)
+        summary = check_checkout_tomorrow(dry_run=args.dry_run, shard=args.shard, horizon=horizon)
+        if args.plan_file:
+            write_plan(summary.get('plan', []), args.plan_file, args.format)
+
+
+def main():
+    """Main function to run the script."""
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Airbnb Cleaner Notification')
+    parser.add_argument('--dry-run', action='store_true', help='Do not send SMS, just print what would be sent')
+    parser.add_argument('--test-sms', action='store_true', help='Send a test SMS to the cleaner')
+    parser.add_argument('--daemon', action='store_true',
+                        help="Keep running and check each listing daily at its local NOTIFY_TIME")
+    parser.add_argument('--horizon', type=int, metavar='N',
+                        help='Print every turnover in the next N days for all listings instead of sending reminders')
+    parser.add_argument('--format', choices=['json', 'csv'], default='json', help='Output format for --horizon')
+    parser.add_argument('--output', help='Write the --horizon schedule to this file instead of stdout')
+    parser.add_argument('--plan-file', metavar='PATH',
+                        help='Send the reminders and also write the schedule of the next --horizon days '
+                             f'(default {DEFAULT_PLAN_HORIZON}) to PATH, from the feeds parsed for the reminders')
+    parser.add_argument('--shard', type=sharding.Shard.parse, metavar='I/N',
+                        help='Only check shard I (from 0) of N, with its own feed cache and reservation database')
+    parser.add_argument('--shards', type=int, metavar='N',
+                        help='Check all listings in N shards running as parallel processes')
+    parser.add_argument('--resend-undelivered', type=float, nargs='?', const=24, metavar='HOURS',
+                        help='Re-send the messages of the last HOURS (default 24) that Twilio could not deliver')
+    parser.add_argument('--merge-metrics', nargs='+', metavar='FILE',
+                        help='Merge JSON metrics files written by shards into --metrics-file (or print them)')
+    parser.add_argument('--metrics-file', help='Export timing metrics to this file (.prom for Prometheus text, else JSON)')
+    parser.add_argument('--profile', metavar='PATH', help='Run under cProfile and write the stats to PATH')
+    parser.add_argument('--trace-memory', action='store_true', help='Log the top memory allocation sites (tracemalloc)')
+    args = parser.parse_args()
+    
+    # Write logs from a background thread so fetching and sending never wait on the disk; what is
+    # logged while config.json is loaded is kept until the log file it names is set up
+    log_pipeline.hold()
+    log_pipeline.configure(settings.get_settings())
+    
+    with metrics.profiled(args.profile, args.trace_memory):
+        run(args)
+    
+    if args.metrics_file and not args.daemon:
+        metrics.METRICS.export(args.metrics_file)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import event_index
+import feed_fetcher
+import ical_parser
+import settings
+import sms_dispatcher
+
+BENCH_TODAY = datetime.date(2020, 6, 1)  # "Today" used when evaluating synthetic feeds
+MAIN_MODULE = 'airbnb_cleaner_notification'
+STARTUP_COMMANDS = {  # Cold starts timed by the startup benchmark
+    'import': ['-c', f'import {MAIN_MODULE}'],
+    'help': [f'{MAIN_MODULE}.py', '--help'],
+}
+
+
+def generate_feed(num_events, start_date=datetime.date(2020, 1, 1), seed_uid='bench'):
+    """Generate a synthetic Airbnb-style iCal feed with num_events back-to-back VEVENTs."""
+    lines = [
+        "BEGIN:VCALENDAR",
+        "PRODID:-//Airbnb Inc//Hosting Calendar 1.0//EN",
+        "CALSCALE:GREGORIAN",
+        "VERSION:2.0",
+    ]
+    day = start_date
+    for i in range(num_events):
+        nights = 1 + i % 5
+        end = day + datetime.timedelta(days=nights)
+        reserved = i % 3 != 0
+        lines += [
+            "BEGIN:VEVENT",
+            "DTSTAMP:20250309T114927Z",
+            f"DTSTART;VALUE=DATE:{day.strftime('%Y%m%d')}",
+            f"DTEND;VALUE=DATE:{end.strftime('%Y%m%d')}",
+            f"SUMMARY:{'Reserved' if reserved else 'Airbnb (Not available)'}",
+            f"UID:{seed_uid}-{i:08x}@airbnb.com",
+        ]
+        if reserved:
+            lines += [
+                "DESCRIPTION:Reservation URL: https://www.airbnb.com/hosting/reservations/de",
+                f" tails/HM{i:08X}\\nPhone Number (Last 4 Digits): {i % 10000:04d}",
+            ]
+        lines.append("END:VEVENT")
+        day = end + datetime.timedelta(days=i % 2)
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(lines) + "\r\n"
+
+
+def time_call(func, *args, repeat=3):
+    """Return the best wall-clock time of func(*args) over repeat runs, and its last result."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def start_server(handler_class):
+    """Start a threaded HTTP server on a free local port and return it."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_feed_server(feeds):
+    """Serve feeds (a dict of path -> iCal text) as a local stand-in for Airbnb."""
+    bodies = {path: text.encode('utf-8') for path, text in feeds.items()}
+
+    class FeedHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            body = bodies.get(self.path)
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/calendar; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return start_server(FeedHandler)
+
+
+def start_mock_twilio():
+    """Start a local server that accepts Twilio Messages API calls and returns queued messages."""
+    counter = {'messages': 0}
+    lock = threading.Lock()
+
+    class TwilioHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            with lock:
+                counter['messages'] += 1
+                sid = f"SM{counter['messages']:032x}"
+            body = json.dumps({'sid': sid, 'status': 'queued'}).encode('utf-8')
+            self.send_response(201)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return start_server(TwilioHandler), counter
+
+
+def make_mock_twilio_client(account_sid, auth_token, base_url, pool_size):
+    """Create a Twilio client whose requests go to base_url instead of api.twilio.com."""
+    from requests.adapters import HTTPAdapter
+    from twilio.http.http_client import TwilioHttpClient
+    from twilio.rest import Client
+
+    class RedirectingHttpClient(TwilioHttpClient):
+        def request(self, method, url, *args, **kwargs):
+            url = re.sub(r'^https://[^/]+', base_url, url)
+            return super().request(method, url, *args, **kwargs)
+
+    http_client = RedirectingHttpClient(pool_connections=True)
+    http_client.session.mount('http://', HTTPAdapter(pool_maxsize=pool_size))
+    return Client(account_sid, auth_token, http_client=http_client)
+
+
+def benchmark_parse(sizes, repeat):
+    """Time the streaming parser and icalendar on single feeds of each size."""
+    results = []
+    for size in sizes:
+        feed = generate_feed(size)
+        fast_time, fast_events = time_call(ical_parser.parse_events, feed, True, repeat=repeat)
+        full_time, full_events = time_call(ical_parser.parse_events_icalendar, feed, repeat=repeat)
+        agree = [(e['uid'], e['start'], e['end']) for e in fast_events] == \
+            [(e['uid'], e['start'], e['end']) for e in full_events]
+        results.append({
+            'events': size,
+            'fast_seconds': fast_time,
+            'icalendar_seconds': full_time,
+            'speedup': full_time / fast_time,
+            'parsers_agree': agree,
+        })
+    return results
+
+
+def benchmark_fleet(listing_counts, events_per_listing, repeat, max_workers):
+    """Time fetch and evaluate for fleets of listings served by a local feed server."""
+    import airbnb_cleaner_notification
+
+    results = []
+    for count in listing_counts:
+        feeds = {f"/feed/{i}.ics": generate_feed(events_per_listing, seed_uid=f"listing{i}") for i in range(count)}
+        server = start_feed_server(feeds)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        urls = [base + path for path in feeds]
+        try:
+            fetch_time, fetched = time_call(
+                lambda: feed_fetcher.fetch_feeds(urls, max_workers=max_workers, per_host_concurrency=max_workers,
+                                                 per_host_interval=0, parse=ical_parser.parse_events),
+                repeat=repeat)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        listings = [{'NAME': f"listing{i}", 'PROPERTY_LOCATION': f"Listing {i}", 'CLEANER_PHONE': '+15555550100',
+                     'TIMEZONE': 'UTC'} for i in range(count)]
+        events = [fetched[url].events for url in urls]
+
+        def evaluate():
+            # The evaluation step of a reminder run: index each feed and find tomorrow's turnovers
+            tz = event_index.get_timezone('UTC')
+            indexes = [(listing, event_index.EventIndex.from_events(listing_events, tz))
+                       for listing, listing_events in zip(listings, events)]
+            return len(airbnb_cleaner_notification.find_turnovers(indexes, None, today=BENCH_TODAY))
+
+        evaluate_time, checkouts = time_call(evaluate, repeat=repeat)
+        results.append({
+            'listings': count,
+            'events_per_listing': events_per_listing,
+            'fetch_and_parse_seconds': fetch_time,
+            'evaluate_seconds': evaluate_time,
+            'checkouts_found': checkouts,
+        })
+    return results
+
+
+def parse_importtime(stderr):
+    """Parse -X importtime output into (module, depth, self_us, cumulative_us) tuples, in print order."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            continue  # Header line
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return entries
+
+
+def module_imports(entries, module):
+    """Return module's cumulative import time and its direct imports as (name, cumulative_us), slowest first."""
+    children = []
+    for name, depth, _, cumulative_us in entries:
+        if depth == 1:
+            children.append((name, cumulative_us))
+        elif depth == 0:
+            if name == module:
+                return cumulative_us, sorted(children, key=lambda child: child[1], reverse=True)
+            children = []
+    return None, []
+
+
+def benchmark_startup(repeat, top=10):
+    """Time cold starts of the CLI in fresh interpreters and report where import time goes."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=root)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:  # Keeps the log file of each run out of the tree
+        for label, command in STARTUP_COMMANDS.items():
+            argv = [sys.executable, '-X', 'importtime'] + [
+                os.path.join(root, arg) if arg.endswith('.py') else arg for arg in command]
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                completed = subprocess.run(argv, cwd=workdir, env=env, capture_output=True, text=True)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            entries = parse_importtime(completed.stderr)
+            import_us, imports = module_imports(entries, MAIN_MODULE)
+            if import_us is None:
+                # Run as a script, the module is __main__: its imports are the top-level ones after site
+                names = [name for name, _, _, _ in entries]
+                script = entries[names.index('site') + 1:] if 'site' in names else entries
+                imports = sorted(((name, cumulative_us) for name, depth, _, cumulative_us in script if depth == 0),
+                                 key=lambda entry: entry[1], reverse=True)
+                import_us = sum(cumulative_us for _, cumulative_us in imports)
+            results.append({
+                'command': label,
+                'seconds': best,
+                'import_seconds': import_us / 1e6,
+                'modules_imported': len(entries),
+                'slowest_imports': [{'module': name, 'seconds': cumulative_us / 1e6}
+                                    for name, cumulative_us in imports[:top]],
+            })
+    return results
+
+
+def benchmark_dispatch(message_counts, max_workers):
+    """Time sending messages through SmsDispatcher and the Twilio client against a mock server."""
+    server, counter = start_mock_twilio()
+    config = settings.Settings({
+        'TWILIO_ACCOUNT_SID': 'ACbenchmark',
+        'TWILIO_AUTH_TOKEN': 'benchmark',
+        'TWILIO_PHONE_NUMBER': '+15550000000',
+    })
+    sms_dispatcher.set_twilio_client(
+        config.twilio_account_sid, config.twilio_auth_token,
+        make_mock_twilio_client(config.twilio_account_sid, config.twilio_auth_token,
+                                f"http://127.0.0.1:{server.server_address[1]}", max_workers))
+
+    def send(phone_number, message):
+        client = sms_dispatcher.get_twilio_client(config.twilio_account_sid, config.twilio_auth_token)
+        client.messages.create(body=message, from_=config.twilio_phone_number, to=phone_number)
+
+    results = []
+    try:
+        for count in message_counts:
+            dispatcher = sms_dispatcher.SmsDispatcher(send, max_workers=max_workers, rate=1e9, burst=max_workers)
+            start = time.perf_counter()
+            for i in range(count):
+                dispatcher.submit(f"+1555{i:07d}", "Cleaning needed tomorrow at Benchmark Unit.")
+            stats = dispatcher.close()
+            elapsed = time.perf_counter() - start
+            results.append({
+                'messages': count,
+                'seconds': elapsed,
+                'messages_per_second': count / elapsed,
+                'stats': stats,
+            })
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def benchmark_notify(message_counts, max_workers):
+    """Time the whole notify pipeline offline, with the in-process fake SMS provider.
+
+    Reminders are queued on an Outbox, flushed through an unthrottled
+    SmsDispatcher and sent by deliver_sms, as in a daily run. A second run
+    sends through a FailoverProvider whose preferred provider fails a fifth
+    of its sends, to measure the cost of failing over.
+    """
+    import airbnb_cleaner_notification
+    import message_composer
+    import sms_providers
+
+    config = settings.Settings({
+        'SMS_PROVIDERS': ['fake'],
+        'SMS_MAX_WORKERS': max_workers,
+        'SMS_RATE_PER_SECOND': 1e9,
+        'SMS_BURST': max_workers,
+    })
+
+    def run(count, send):
+        outbox = message_composer.Outbox()
+        futures = [outbox.add(f"+1555{i:07d}", "Cleaning needed tomorrow at Benchmark Unit.") for i in range(count)]
+        start = time.perf_counter()
+        dispatcher = sms_dispatcher.create_dispatcher(config, send)
+        outbox.flush(dispatcher.submit)
+        stats = dispatcher.close()
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - start
+        return {'messages': count, 'seconds': elapsed, 'messages_per_second': count / elapsed, 'stats': stats}
+
+    results = []
+    for count in message_counts:
+        result = run(count, lambda phone_number, message: airbnb_cleaner_notification.deliver_sms(
+            phone_number, message, config))
+        result['provider'] = 'fake'
+        results.append(result)
+
+        flaky = sms_providers.FakeProvider(failure_rate=0.2, name='flaky')
+        standby = sms_providers.FakeProvider(name='standby')
+        failover = sms_providers.FailoverProvider([flaky, standby])
+        result = run(count, failover.send)
+        result['provider'] = failover.name
+        result['sent_by'] = {flaky.name: flaky.sent, standby.name: standby.sent}
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the parse -> evaluate -> notify pipeline')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000, 100000],
+                        help='Number of VEVENTs in each synthetic feed for the parser benchmark')
+    parser.add_argument('--listings', type=int, nargs='+', default=[1, 100, 1000],
+                        help='Fleet sizes for the fetch and evaluate benchmark')
+    parser.add_argument('--events-per-listing', type=int, default=200, help='VEVENTs per listing in fleet runs')
+    parser.add_argument('--messages', type=int, nargs='+', default=[100, 1000],
+                        help='Message counts for the dispatch benchmark')
+    parser.add_argument('--notify-messages', type=int, nargs='+', default=[1000, 10000],
+                        help='Message counts for the offline notify benchmark')
+    parser.add_argument('--workers', type=int, default=16, help='Concurrent fetch and dispatch workers')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is reported)')
+    parser.add_argument('--skip', nargs='+', default=[], choices=['startup', 'parse', 'fleet', 'dispatch', 'notify'],
+                        help='Benchmark stages to skip')
+    parser.add_argument('--output', help='Write results as JSON to this file instead of stdout')
+    args = parser.parse_args()
+
+    # Keep per-event log lines out of the measurements
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+    if 'startup' not in args.skip:
+        results['startup'] = benchmark_startup(args.repeat)
+    if 'parse' not in args.skip:
+        results['parse'] = benchmark_parse(args.sizes, args.repeat)
+    if 'fleet' not in args.skip:
+        results['fleet'] = benchmark_fleet(args.listings, args.events_per_listing, args.repeat, args.workers)
+    if 'dispatch' not in args.skip:
+        results['dispatch'] = benchmark_dispatch(args.messages, args.workers)
+    if 'notify' not in args.skip:
+        results['notify'] = benchmark_notify(args.notify_messages, args.workers)
+
+    output = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"Wrote benchmark results to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+import heapq
+import logging
+
+import event_index
+import metrics
+
+
+def start_of(event):
+    return event.start
+
+
+def merge_timelines(timelines):
+    """Merge the events of several channel feeds of one property into a single timeline.
+
+    timelines holds one list of Events per channel, each sorted by check-in
+    (as in EventIndex.by_start). A single sweep over the k-way merge of the
+    lists joins every reservation that overlaps the one before it, which
+    removes the copies of a booking that several channels report as
+    reserved, and joins overlapping or back-to-back blocked periods. Back-
+    to-back reservations stay separate: a guest leaving the day the next
+    one arrives is a same-day turnover, not one stay. Reservations are
+    fixed boundaries, so blocked periods, which are mostly the copies each
+    channel exports of the others' bookings, are then clipped to the dates
+    no reservation covers; a block spanning two back-to-back bookings on
+    another channel does not hide the checkout between them. A merged stay
+    keeps the UID and summary of its first event and spans all the dates
+    it covers.
+
+    Returns (events, conflicts): the merged Events sorted by check-in and
+    the pairs of reservations with different dates that overlap, i.e.
+    double bookings across channels. Runs in O(n log k) for n events from
+    k channels.
+    """
+    stays = []  # [start, end, first reservation, latest-ending reservation]
+    blocks = []  # [start, end, first event]
+    conflicts = []
+    for event in heapq.merge(*timelines, key=start_of):
+        if not event_index.is_reservation(event.summary):
+            if blocks and event.start <= blocks[-1][1]:
+                blocks[-1][1] = max(blocks[-1][1], event.end)
+            else:
+                blocks.append([event.start, event.end, event])
+            continue
+        if stays and event.start < stays[-1][1]:
+            stay = stays[-1]
+            latest = stay[3]
+            if (event.start, event.end) != (latest.start, latest.end):
+                conflicts.append((latest, event))
+            if event.end > latest.end:
+                stay[3] = event
+            stay[1] = max(stay[1], event.end)
+        else:
+            stays.append([event.start, event.end, event, event])
+
+    # Keep the parts of each blocked period that no reservation covers
+    merged = [event_index.Event(start, end, first.uid, first.summary) for start, end, first, _ in stays]
+    i = 0
+    for start, end, first in blocks:
+        while i < len(stays) and stays[i][1] <= start:
+            i += 1
+        j = i
+        pieces = 0
+        while start < end:
+            if j < len(stays) and stays[j][0] < end:
+                piece_end = stays[j][0]
+                next_start = stays[j][1]
+                j += 1
+            else:
+                piece_end = next_start = end
+            if start < piece_end:
+                # Later pieces of a block get their own UID so each is a separate event in snapshots
+                uid = first.uid if not pieces or not first.uid else f"{first.uid}#{start.isoformat()}"
+                merged.append(event_index.Event(start, piece_end, uid, first.summary))
+                pieces += 1
+            start = next_start
+    merged.sort(key=start_of)
+    return merged, conflicts
+
+
+def merge_indexes(name, indexes):
+    """Return one EventIndex for a property from the EventIndexes of its channel feeds.
+
+    A single channel is returned as is. Overlapping reservations with
+    different dates are logged as possible double bookings.
+    """
+    if len(indexes) == 1:
+        return indexes[0]
+    events, conflicts = merge_timelines([index.by_start for index in indexes])
+    for first, second in conflicts:
+        metrics.inc('double_bookings_total', listing=name)
+        logging.warning(f"Possible double booking at {name}: {first.start} to {first.end} ({first.uid}) "
+                        f"overlaps {second.start} to {second.end} ({second.uid})")
+    return event_index.EventIndex(events)
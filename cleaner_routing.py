@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+
+class Cleaner:
+    """A cleaner from the CLEANERS setting and the jobs assigned to them in this run.
+
+    reminded holds the listings an earlier run already reminded the cleaner
+    about for the same checkout day; they count against CAPACITY too.
+    """
+
+    __slots__ = ('name', 'phone', 'capacity', 'areas', 'jobs', 'reminded', 'booked')
+
+    def __init__(self, name, phone, capacity=None, areas=None, reminded=()):
+        self.name = name
+        self.phone = phone
+        self.capacity = capacity
+        self.areas = frozenset(areas) if areas else None
+        self.jobs = []
+        self.reminded = frozenset(reminded)
+        self.booked = len(self.reminded)
+
+    def serves(self, area):
+        return self.areas is None or area in self.areas
+
+    def take(self, turnover):
+        self.jobs.append(turnover)
+        if turnover.listing not in self.reminded:
+            self.booked += 1
+
+    def remaining(self):
+        """Number of further jobs the cleaner can take (infinite if no CAPACITY is set)."""
+        if self.capacity is None:
+            return float('inf')
+        return self.capacity - self.booked
+
+
+def load_cleaners(config, reminded=None):
+    """Return the cleaners of the CLEANERS setting, or None if it is not set.
+
+    Each CLEANERS entry in config.json gives NAME, PHONE and optionally
+    CAPACITY (jobs per day) and AREAS (the listing AREA values the cleaner
+    covers; all areas if omitted). reminded maps a PHONE to the listings
+    already reminded to it for the day being routed.
+    """
+    entries = config.get('CLEANERS')
+    if not entries:
+        return None
+    reminded = reminded or {}
+    return [Cleaner(entry.get('NAME', entry['PHONE']), entry['PHONE'], entry.get('CAPACITY'), entry.get('AREAS'),
+                    reminded.get(entry['PHONE'], ()))
+            for entry in entries]
+
+
+def urgency(turnover):
+    """Sort key putting the tightest cleaning windows first (same-day turnovers, then by days free)."""
+    window = turnover.window_days
+    return (window is None, window if window is not None else 0)
+
+
+def assign(turnovers, cleaners, areas):
+    """Assign turnovers to cleaners, returning (cleaners, unassigned turnovers).
+
+    areas maps a listing NAME to its AREA. A turnover a cleaner was already
+    reminded about stays with them. The others are handed out in order of
+    urgency so that same-day turnovers get capacity first. Within an area,
+    a job goes to the cleaner already working there while they have
+    capacity left, keeping each cleaner's jobs close together; otherwise to
+    the eligible cleaner with the most remaining capacity. Each job costs
+    O(cleaners in its area), so thousands of jobs take milliseconds.
+    """
+    eligible = {}
+    for area in set(areas.values()):
+        eligible[area] = [cleaner for cleaner in cleaners if cleaner.serves(area)]
+
+    owners = {listing: cleaner for cleaner in cleaners for listing in cleaner.reminded}
+    current = {}  # Area -> cleaner most recently assigned there
+    unassigned = []
+    for turnover in sorted(turnovers, key=urgency):
+        if turnover.listing in owners:
+            owners[turnover.listing].take(turnover)
+            continue
+        area = areas[turnover.listing]
+        cleaner = current.get(area)
+        if cleaner is None or cleaner.remaining() <= 0:
+            candidates = eligible.get(area, ())
+            cleaner = max(candidates, key=Cleaner.remaining, default=None)
+            if cleaner is None or cleaner.remaining() <= 0:
+                unassigned.append(turnover)
+                continue
+            current[area] = cleaner
+        cleaner.take(turnover)
+    return cleaners, unassigned
+
+
+def assign_by_listing(turnovers):
+    """Give each turnover to its listing's own CLEANER_PHONE, the setup without CLEANERS.
+
+    Returns (cleaners, unassigned turnovers) like assign(); a cleaner with
+    several listings gets all of their jobs, and nothing is unassigned.
+    """
+    cleaners = {}
+    for turnover in sorted(turnovers, key=urgency):
+        cleaner = cleaners.get(turnover.cleaner_phone)
+        if cleaner is None:
+            cleaner = cleaners[turnover.cleaner_phone] = Cleaner(turnover.cleaner_phone, turnover.cleaner_phone)
+        cleaner.take(turnover)
+    return list(cleaners.values()), []
+
+
+def route(config, listings, turnovers, reminded=None):
+    """Assign turnovers to the CLEANERS by area and capacity, or to each listing's CLEANER_PHONE without them.
+
+    CAPACITY is per checkout day, so each day is routed separately.
+    reminded, if given, is a function returning {PHONE: listings} of the
+    reminders earlier runs sent for a checkout day (such as
+    NotificationLedger.reminded); those count against the day's capacity,
+    so a cleaner is not overbooked by runs at different NOTIFY_TIMEs.
+    """
+    if not config.get('CLEANERS'):
+        return assign_by_listing(turnovers)
+    areas = {listing['NAME']: listing['AREA'] for listing in listings}
+    by_day = {}
+    for turnover in turnovers:
+        by_day.setdefault(turnover.checkout, []).append(turnover)
+    routed, unassigned = [], []
+    for day, jobs in sorted(by_day.items()):
+        cleaners, missed = assign(jobs, load_cleaners(config, reminded(day) if reminded else None), areas)
+        routed.extend(cleaners)
+        unassigned.extend(missed)
+    return routed, unassigned
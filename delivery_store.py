@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+import argparse
+import atexit
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+# Constants
+DEFAULT_DB_FILE = 'deliveries.db'  # SQLite database with the delivery status of every SMS sent
+DEFAULT_BATCH_SIZE = 100  # Updates written in one transaction
+DEFAULT_FLUSH_SECONDS = 1.0  # Longest an update waits before it is written
+DEFAULT_STUCK_MINUTES = 30  # A message still queued after this long counts as not received
+
+# Order of Twilio message statuses; callbacks can arrive out of order, so a
+# status never replaces a later one
+STATUS_RANK = {
+    'accepted': 0, 'queued': 0, 'sending': 1, 'sent': 2,
+    'delivered': 3, 'undelivered': 3, 'failed': 3, 'read': 4,
+}
+PENDING_STATUSES = ('accepted', 'queued', 'sending')
+FAILED_STATUSES = ('undelivered', 'failed')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    sid TEXT PRIMARY KEY,
+    phone TEXT,
+    body TEXT,
+    sent_at REAL,
+    status TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    error_code TEXT,
+    updated_at REAL NOT NULL,
+    resent_sid TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS messages_sent_at ON messages (sent_at);
+"""
+
+# Sends and status callbacks both upsert; whichever arrives first creates the row
+UPSERT = """
+INSERT INTO messages (sid, phone, body, sent_at, status, rank, error_code, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (sid) DO UPDATE SET
+    phone = coalesce(excluded.phone, phone),
+    body = coalesce(excluded.body, body),
+    sent_at = coalesce(excluded.sent_at, sent_at),
+    status = CASE WHEN excluded.rank >= rank THEN excluded.status ELSE status END,
+    error_code = CASE WHEN excluded.rank >= rank THEN excluded.error_code ELSE error_code END,
+    rank = max(rank, excluded.rank),
+    updated_at = excluded.updated_at
+"""
+
+
+class DeliveryStore:
+    """SQLite store of sent SMS and their delivery status from Twilio status callbacks.
+
+    Writes are queued in memory and committed by a background thread in
+    batches of up to batch_size, at least every flush_seconds, so neither a
+    send nor a webhook request waits for the disk. close() (or leaving the
+    with block) writes whatever is still queued. The database runs in WAL
+    mode, so the reminder script and the webhook can both write to it.
+    """
+
+    def __init__(self, path=DEFAULT_DB_FILE, batch_size=DEFAULT_BATCH_SIZE, flush_seconds=DEFAULT_FLUSH_SECONDS):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._db_lock = threading.Lock()
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name='delivery-store-writer', daemon=True)
+        self._writer.start()
+
+    def _queue(self, row):
+        with self._pending_lock:
+            self._pending.append(row)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def record_sent(self, sid, phone, body, status='queued'):
+        """Queue the record of a message just handed to Twilio."""
+        now = time.time()
+        self._queue((sid, phone, body, now, status, STATUS_RANK.get(status, 0), None, now))
+
+    def record_status(self, sid, status, error_code=None, phone=None):
+        """Queue a delivery status reported by a Twilio status callback."""
+        self._queue((sid, phone, None, None, status, STATUS_RANK.get(status, 0), error_code, time.time()))
+
+    def flush(self):
+        """Write all queued updates in one transaction. Returns the number written."""
+        with self._pending_lock:
+            rows, self._pending = self._pending, []
+        if not rows:
+            return 0
+        with self._db_lock, self._conn:
+            self._conn.executemany(UPSERT, rows)
+        return len(rows)
+
+    def _write_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logging.error(f"Error writing delivery statuses to {self.path}: {e}")
+
+    def undelivered(self, since, stuck_minutes=DEFAULT_STUCK_MINUTES):
+        """Return the messages sent since (a timestamp) that did not reach their recipient.
+
+        These are messages Twilio reported as failed or undelivered, and
+        messages still queued after stuck_minutes. Messages already re-sent
+        are left out. Each is a dict with sid, phone, body, status and
+        error_code, oldest first.
+        """
+        self.flush()
+        stuck_before = time.time() - stuck_minutes * 60
+        query = (f"SELECT sid, phone, body, status, error_code, sent_at FROM messages "
+                 f"WHERE sent_at >= ? AND resent_sid IS NULL "
+                 f"AND (status IN ({', '.join('?' * len(FAILED_STATUSES))}) "
+                 f"OR (status IN ({', '.join('?' * len(PENDING_STATUSES))}) AND sent_at < ?)) "
+                 f"ORDER BY sent_at")
+        with self._db_lock:
+            rows = self._conn.execute(query, (since,) + FAILED_STATUSES + PENDING_STATUSES + (stuck_before,))
+            return [{'sid': sid, 'phone': phone, 'body': body, 'status': status, 'error_code': error_code,
+                     'sent_at': sent_at}
+                    for sid, phone, body, status, error_code, sent_at in rows]
+
+    def mark_resent(self, sid, resent_sid):
+        """Record that a message was sent again, so it is not re-sent twice."""
+        with self._db_lock, self._conn:
+            self._conn.execute('UPDATE messages SET resent_sid = ? WHERE sid = ?', (resent_sid, sid))
+
+    def status_counts(self, since):
+        """Count the messages sent since (a timestamp) by their latest status."""
+        self.flush()
+        with self._db_lock:
+            return dict(self._conn.execute(
+                'SELECT status, count(*) FROM messages WHERE sent_at >= ? GROUP BY status', (since,)))
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self._writer.join()
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_delivery_store(config):
+    """Return the process-wide DeliveryStore named by config.json settings, e.g. for the webhook."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = load_delivery_store(config)
+            atexit.register(_store.close)  # Write the updates still queued
+        return _store
+
+
+def load_delivery_store(config):
+    """Open the DeliveryStore named by config.json settings."""
+    return DeliveryStore(config.get('DELIVERY_DB', DEFAULT_DB_FILE))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report on the delivery of SMS sent by the cleaning reminder')
+    parser.add_argument('report', choices=['undelivered', 'statuses'], help='Report to print as JSON')
+    parser.add_argument('--db', default=DEFAULT_DB_FILE, help='Delivery database file')
+    parser.add_argument('--hours', type=float, default=24, help='Only include messages sent in the last HOURS')
+    parser.add_argument('--stuck-minutes', type=float, default=DEFAULT_STUCK_MINUTES,
+                        help='Count messages still queued after this long as not received')
+    args = parser.parse_args()
+
+    since = time.time() - args.hours * 3600
+    with DeliveryStore(args.db) as store:
+        if args.report == 'undelivered':
+            report = store.undelivered(since, args.stuck_minutes)
+        else:
+            report = store.status_counts(since)
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -14,10 +14,29 @@ ssh ${REMOTE_USER}@${REMOTE_HOST} "mkdir -p ${REMOTE_DIR}"
 # Copy the necessary files to the remote server
 echo "Copying files to the remote server..."
 scp "${LOCAL_DIR}/airbnb_cleaner_notification.py" \
+    "${LOCAL_DIR}/channel_merge.py" \
+    "${LOCAL_DIR}/cleaner_routing.py" \
+    "${LOCAL_DIR}/delivery_store.py" \
+    "${LOCAL_DIR}/event_index.py" \
+    "${LOCAL_DIR}/feed_cache.py" \
+    "${LOCAL_DIR}/feed_fetcher.py" \
+    "${LOCAL_DIR}/ical_parser.py" \
+    "${LOCAL_DIR}/log_pipeline.py" \
+    "${LOCAL_DIR}/message_composer.py" \
+    "${LOCAL_DIR}/metrics.py" \
+    "${LOCAL_DIR}/notification_ledger.py" \
+    "${LOCAL_DIR}/planner.py" \
+    "${LOCAL_DIR}/replay.py" \
+    "${LOCAL_DIR}/reservation_store.py" \
+    "${LOCAL_DIR}/scheduler.py" \
+    "${LOCAL_DIR}/settings.py" \
+    "${LOCAL_DIR}/sharding.py" \
+    "${LOCAL_DIR}/sms_dispatcher.py" \
+    "${LOCAL_DIR}/sms_providers.py" \
+    "${LOCAL_DIR}/snapshot_store.py" \
     "${LOCAL_DIR}/requirements.txt" \
     "${LOCAL_DIR}/README.md" \
     "${LOCAL_DIR}/test_twilio.py" \
-    "${LOCAL_DIR}/check_message_status.py" \
     "${LOCAL_DIR}/config.json" \
     ${REMOTE_USER}@${REMOTE_HOST}:${REMOTE_DIR}/
 
@@ -63,8 +82,6 @@ Type=oneshot
 User=topcat
 WorkingDirectory=/home/topcat/airbnb-cleaning-reminder
 ExecStart=/home/topcat/airbnb-cleaning-reminder/venv/bin/python /home/topcat/airbnb-cleaning-reminder/airbnb_cleaner_notification.py
-StandardOutput=append:/home/topcat/airbnb-cleaning-reminder/cleaning_log.txt
-StandardError=append:/home/topcat/airbnb-cleaning-reminder/cleaning_log.txt
 
 [Install]
 WantedBy=multi-user.target
@@ -101,5 +118,5 @@ TIMEREOF
     echo "The script will run automatically every day at 4 PM PST (midnight UTC)."
     echo "To check the timer status, run: systemctl status airbnb-cleaner.timer"
     echo "To check the service status, run: systemctl status airbnb-cleaner.service"
-    echo "To view logs, check: ~/airbnb-cleaning-reminder/cleaning_log.txt"
+    echo "To view logs, check: ~/airbnb-cleaning-reminder/cleaning_detailed.log (and journalctl -u airbnb-cleaner for crashes)"
 EOF
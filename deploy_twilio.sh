@@ -14,9 +14,28 @@ echo "Attempting to connect to the server via SSH..."
 # Copy the Twilio files to the remote server
 echo "Copying Twilio files to the remote server..."
 scp "${LOCAL_DIR}/airbnb_cleaner_notification.py" \
+    "${LOCAL_DIR}/channel_merge.py" \
+    "${LOCAL_DIR}/cleaner_routing.py" \
+    "${LOCAL_DIR}/delivery_store.py" \
+    "${LOCAL_DIR}/event_index.py" \
+    "${LOCAL_DIR}/feed_cache.py" \
+    "${LOCAL_DIR}/feed_fetcher.py" \
+    "${LOCAL_DIR}/ical_parser.py" \
+    "${LOCAL_DIR}/log_pipeline.py" \
+    "${LOCAL_DIR}/message_composer.py" \
+    "${LOCAL_DIR}/metrics.py" \
+    "${LOCAL_DIR}/notification_ledger.py" \
+    "${LOCAL_DIR}/planner.py" \
+    "${LOCAL_DIR}/replay.py" \
+    "${LOCAL_DIR}/reservation_store.py" \
+    "${LOCAL_DIR}/scheduler.py" \
+    "${LOCAL_DIR}/settings.py" \
+    "${LOCAL_DIR}/sharding.py" \
+    "${LOCAL_DIR}/sms_dispatcher.py" \
+    "${LOCAL_DIR}/sms_providers.py" \
+    "${LOCAL_DIR}/snapshot_store.py" \
     "${LOCAL_DIR}/requirements.txt" \
     "${LOCAL_DIR}/test_twilio.py" \
-    "${LOCAL_DIR}/check_message_status.py" \
     "${LOCAL_DIR}/config.json" \
     ${REMOTE_USER}@${REMOTE_HOST}:${REMOTE_DIR}/
 
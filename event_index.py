@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+import bisect
+import datetime
+import functools
+
+import pytz
+
+
+@functools.lru_cache(maxsize=None)
+def get_timezone(name):
+    """Return the pytz timezone called name, resolving each name only once per process."""
+    return pytz.timezone(name)
+
+
+def local_today(timezone, now=None):
+    """Return the current date in the named timezone (not the server's)."""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    return now.astimezone(get_timezone(timezone)).date()
+
+
+def to_date(value, tz=None):
+    """Return the calendar date of a DTSTART/DTEND value.
+
+    Timezone-aware datetimes (UTC or with a TZID) are converted to tz, the
+    property's timezone, first; floating datetimes already are local time.
+    """
+    if isinstance(value, datetime.datetime):
+        if tz is not None and value.tzinfo is not None:
+            value = value.astimezone(tz)
+        return value.date()
+    return value
+
+
+def is_reservation(summary):
+    """True for guest bookings, as opposed to dates the host blocked ('Airbnb (Not available)').
+
+    Booking.com exports every booking as 'CLOSED - Not available'.
+    """
+    summary = summary.lower()
+    return 'reserved' in summary or summary.startswith('closed')
+
+
+class Event:
+    """A single booking or blocked period with its dates already normalized."""
+
+    __slots__ = ('start', 'end', 'uid', 'summary')
+
+    def __init__(self, start, end, uid='', summary=''):
+        self.start = start
+        self.end = end
+        self.uid = uid
+        self.summary = summary
+
+    def __repr__(self):
+        return f"Event({self.start}, {self.end}, {self.uid!r}, {self.summary!r})"
+
+
+class EventIndex:
+    """Events sorted by check-in and by checkout for O(log n) date lookups.
+
+    The index is built in a single pass over the parsed events, converting
+    each DTSTART/DTEND to a date once. Lookups bisect the sorted date arrays,
+    so their cost does not grow with the amount of history in the feed.
+    """
+
+    __slots__ = ('by_start', 'starts', 'by_end', 'ends')
+
+    def __init__(self, events):
+        self.by_start = sorted(events, key=lambda event: event.start)
+        self.starts = [event.start for event in self.by_start]
+        self.by_end = sorted(events, key=lambda event: event.end)
+        self.ends = [event.end for event in self.by_end]
+
+    @classmethod
+    def from_events(cls, events, tz=None):
+        """Build an index from event dicts with start, end and optional uid and summary.
+
+        Every DTSTART/DTEND is normalized once to a local date in tz. Plain
+        dates, which is all Airbnb sends, skip the conversion call.
+        """
+        date = datetime.date
+        normalized = []
+        for event in events:
+            start, end = event['start'], event['end']
+            if type(start) is not date:
+                start = to_date(start, tz)
+            if type(end) is not date:
+                end = to_date(end, tz)
+            normalized.append(Event(start, end, event.get('uid', ''), event.get('summary', '')))
+        return cls(normalized)
+
+    def __len__(self):
+        return len(self.by_start)
+
+    def checkouts_on(self, day):
+        """Return the events whose checkout (DTEND) is day."""
+        lo = bisect.bisect_left(self.ends, day)
+        hi = bisect.bisect_right(self.ends, day, lo)
+        return self.by_end[lo:hi]
+
+    def checkouts_between(self, first_day, last_day):
+        """Return the events checking out on or after first_day and on or before last_day, by date."""
+        lo = bisect.bisect_left(self.ends, first_day)
+        hi = bisect.bisect_right(self.ends, last_day, lo)
+        return self.by_end[lo:hi]
+
+    def checkins_between(self, first_day, last_day):
+        """Return the events checking in on or after first_day and on or before last_day."""
+        lo = bisect.bisect_left(self.starts, first_day)
+        hi = bisect.bisect_right(self.starts, last_day, lo)
+        return self.by_start[lo:hi]
+
+    def next_checkin_after(self, day):
+        """Return the first event checking in strictly after day, or None."""
+        i = bisect.bisect_right(self.starts, day)
+        return self.by_start[i] if i < len(self.by_start) else None
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+# Constants
+DEFAULT_CACHE_DIR = '.feed_cache'  # Directory holding cached feed bodies, their parsed events and the cache index
+DEFAULT_TTL = 900  # Seconds a feed without ETag/Last-Modified is served from cache without refetching
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024  # Total size of cached bodies and events before least recently used feeds are evicted
+INDEX_FILE = 'index.json'
+
+
+def encode_events(events):
+    """Convert parsed events into JSON-serializable dicts."""
+    encoded = []
+    for event in events:
+        encoded.append({k: v.isoformat() if isinstance(v, (datetime.date, datetime.datetime)) else v
+                        for k, v in event.items()})
+    return encoded
+
+
+def decode_events(encoded):
+    """Inverse of encode_events: restore date and datetime values."""
+    events = []
+    for item in encoded:
+        event = dict(item)
+        for key in ('start', 'end'):
+            value = event.get(key)
+            if isinstance(value, str):
+                event[key] = (datetime.date.fromisoformat(value) if len(value) == 10
+                              else datetime.datetime.fromisoformat(value))
+        events.append(event)
+    return events
+
+
+class FeedCache:
+    """Persistent cache of iCal feeds keyed by URL.
+
+    Each entry keeps the response body and its parsed events in two files
+    on disk, and its ETag, Last-Modified and sizes in a small JSON index.
+    Feeds with validators are revalidated with a conditional GET; feeds
+    without them are served from the cache until the TTL expires. The total
+    size of the bodies and events is bounded by evicting the least recently
+    used entries.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, INDEX_FILE)
+
+    def _body_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.ics")
+
+    def _events_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.events.json")
+
+    def _write(self, path, text):
+        """Write text to path atomically and return its size in bytes."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+        return os.path.getsize(path)
+
+    @staticmethod
+    def _remove(*paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), 'r') as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logging.error(f"Error loading feed cache index, starting empty: {e}")
+            return {}
+        # Older indexes held the events themselves; those feeds are parsed again on their next use
+        for entry in index.values():
+            if 'events' in entry:
+                del entry['events']
+                entry['events_size'] = 0
+        return index
+
+    def lookup(self, url):
+        """Return the cache entry for url, or None if the feed has not been cached."""
+        with self._lock:
+            entry = self._index.get(url)
+            if entry and not os.path.exists(self._body_path(entry['key'])):
+                del self._index[url]
+                return None
+            return dict(entry) if entry else None
+
+    def is_fresh(self, entry):
+        """True if entry can be used without contacting the server."""
+        if entry.get('etag') or entry.get('last_modified'):
+            return False
+        return time.time() - entry['fetched_at'] < self.ttl
+
+    def conditional_headers(self, entry):
+        """Build If-None-Match/If-Modified-Since headers for a cached entry."""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def read_body(self, entry):
+        with open(self._body_path(entry['key']), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def events(self, entry):
+        """Return the parsed events stored with entry, or None if it was cached unparsed."""
+        if not entry.get('events_size'):
+            return None
+        try:
+            with open(self._events_path(entry['key']), 'r', encoding='utf-8') as f:
+                return decode_events(json.load(f))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.error(f"Error loading cached events for {entry['key']}, parsing again: {e}")
+            return None
+
+    def touch(self, url, revalidated=False):
+        """Mark url as recently used, and as freshly validated after a 304."""
+        with self._lock:
+            entry = self._index.get(url)
+            if entry:
+                entry['last_access'] = time.time()
+                if revalidated:
+                    entry['fetched_at'] = entry['last_access']
+
+    def store(self, url, body, etag=None, last_modified=None, events=None):
+        """Save a freshly downloaded feed body and its parsed events."""
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        body_size = self._write(self._body_path(key), body)
+        if events is not None:
+            events_size = self._write(self._events_path(key), json.dumps(encode_events(events), separators=(',', ':')))
+        else:
+            events_size = 0
+            self._remove(self._events_path(key))
+
+        now = time.time()
+        with self._lock:
+            self._index[url] = {
+                'key': key,
+                'etag': etag,
+                'last_modified': last_modified,
+                'fetched_at': now,
+                'last_access': now,
+                'size': body_size + events_size,
+                'events_size': events_size,
+            }
+            self._evict()
+
+    def store_events(self, url, events):
+        """Attach parsed events to an entry that was cached without them."""
+        with self._lock:
+            entry = self._index.get(url)
+            if not entry:
+                return
+            events_size = self._write(self._events_path(entry['key']),
+                                      json.dumps(encode_events(events), separators=(',', ':')))
+            entry['size'] += events_size - entry.get('events_size', 0)
+            entry['events_size'] = events_size
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        total = sum(entry['size'] for entry in self._index.values())
+        if total <= self.max_bytes:
+            return
+        for url, entry in sorted(self._index.items(), key=lambda item: item[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            total -= entry['size']
+            del self._index[url]
+            self._remove(self._body_path(entry['key']), self._events_path(entry['key']))
+            logging.info(f"Evicted {url} from feed cache")
+
+    def save(self):
+        """Write the cache index to disk atomically."""
+        with self._lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self._index_path() + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._index, f)
+            os.replace(tmp_path, self._index_path())
+
+
+def load_feed_cache(config):
+    """Create a FeedCache from config.json settings, or None if caching is disabled."""
+    if not config.get('FEED_CACHE_ENABLED', True):
+        return None
+    return FeedCache(
+        cache_dir=config.get('FEED_CACHE_DIR', DEFAULT_CACHE_DIR),
+        ttl=config.get('FEED_CACHE_TTL', DEFAULT_TTL),
+        max_bytes=config.get('FEED_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES),
+    )
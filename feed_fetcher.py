@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# Constants
+DEFAULT_MAX_CONCURRENT_FETCHES = 16  # Upper bound on feeds downloaded at the same time
+DEFAULT_PER_HOST_CONCURRENCY = 4  # Parallel requests allowed against a single host
+DEFAULT_PER_HOST_INTERVAL = 0.1  # Minimum seconds between request starts on the same host
+DEFAULT_CONNECT_TIMEOUT = 5.0  # Seconds to establish a connection
+DEFAULT_READ_TIMEOUT = 30.0  # Seconds to wait for each chunk of the response
+DEFAULT_MAX_RETRIES = 2  # Extra attempts after a timeout, connection error, 429 or 5xx
+DEFAULT_BACKOFF_SECONDS = 1.0  # Base delay for jittered exponential backoff between attempts
+DEFAULT_MAX_STALENESS = 48 * 3600  # Oldest cached copy (seconds since last validated) served when a fetch fails
+DEFAULT_CIRCUIT_FAILURES = 5  # Consecutive failed attempts that open a host's circuit
+DEFAULT_CIRCUIT_RESET_SECONDS = 300.0  # How long an open circuit rejects requests before a trial request
+
+RETRYABLE_STATUS = frozenset((429, 500, 502, 503, 504))
+
+_session = None
+_session_pool_size = 0
+_session_lock = threading.Lock()
+_breaker = None
+
+
+def get_session(pool_size=DEFAULT_MAX_CONCURRENT_FETCHES):
+    """Return the process-wide HTTP session so connections are reused across feeds.
+
+    The connection pool is enlarged if a caller needs more concurrent
+    connections than the session was created with.
+    """
+    global _session, _session_pool_size
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.verify = False  # Note: verify=False is not recommended for production
+        if pool_size > _session_pool_size:
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+            _session_pool_size = pool_size
+        return _session
+
+
+class HostRateLimiter:
+    """Limits concurrency and request rate per host."""
+
+    def __init__(self, per_host_concurrency=DEFAULT_PER_HOST_CONCURRENCY,
+                 per_host_interval=DEFAULT_PER_HOST_INTERVAL):
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_interval = per_host_interval
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_start = {}
+
+    def _semaphore(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host_concurrency)
+            return self._semaphores[host]
+
+    def _reserve_slot(self, host):
+        """Reserve the next start time for host and return how long to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.per_host_interval
+            return start - now
+
+    def acquire(self, host):
+        self._semaphore(host).acquire()
+        delay = self._reserve_slot(host)
+        if delay > 0:
+            time.sleep(delay)
+
+    def release(self, host):
+        self._semaphore(host).release()
+
+
+class CircuitBreaker:
+    """Per-host circuit breaker that stops requests to a host that keeps failing.
+
+    After failure_threshold consecutive failed attempts the host's circuit
+    opens and requests are rejected immediately, without using a worker or a
+    host slot, for reset_timeout seconds. Then a single trial request is let
+    through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_CIRCUIT_FAILURES, reset_timeout=DEFAULT_CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = {}
+        self._opened_at = {}
+        self._probing = set()
+
+    def allow(self, host):
+        """True if a request to host may be made now."""
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return True
+            if time.monotonic() - opened_at < self.reset_timeout or host in self._probing:
+                return False
+            self._probing.add(host)
+            return True
+
+    def record_success(self, host):
+        with self._lock:
+            self._failures.pop(host, None)
+            self._probing.discard(host)
+            if self._opened_at.pop(host, None) is not None:
+                logging.info(f"Circuit closed for {host}")
+
+    def record_failure(self, host):
+        with self._lock:
+            failures = self._failures[host] = self._failures.get(host, 0) + 1
+            was_probing = host in self._probing
+            self._probing.discard(host)
+            if failures >= self.failure_threshold:
+                if host not in self._opened_at or was_probing:
+                    logging.warning(f"Circuit opened for {host} after {failures} consecutive failures")
+                    metrics.inc('feed_circuit_opened_total', host=host)
+                self._opened_at[host] = time.monotonic()
+
+
+def get_circuit_breaker(failure_threshold=DEFAULT_CIRCUIT_FAILURES, reset_timeout=DEFAULT_CIRCUIT_RESET_SECONDS):
+    """Return the process-wide circuit breaker so host health is remembered between runs."""
+    global _breaker
+    with _session_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        _breaker.failure_threshold = failure_threshold
+        _breaker.reset_timeout = reset_timeout
+        return _breaker
+
+
+class FetchPolicy:
+    """Timeouts, retries and the stale-serve limit applied to each feed download."""
+
+    __slots__ = ('connect_timeout', 'read_timeout', 'max_retries', 'backoff', 'max_staleness')
+
+    def __init__(self, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF_SECONDS,
+                 max_staleness=DEFAULT_MAX_STALENESS):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_staleness = max_staleness
+
+    def delay(self, attempt):
+        """Full-jitter backoff before retry number attempt (1-based)."""
+        return random.uniform(0, self.backoff * 2 ** (attempt - 1))
+
+
+def load_fetch_policy(config):
+    """Create a FetchPolicy from config.json settings."""
+    return FetchPolicy(
+        connect_timeout=config.get('FETCH_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+        read_timeout=config.get('FETCH_READ_TIMEOUT', DEFAULT_READ_TIMEOUT),
+        max_retries=config.get('FETCH_MAX_RETRIES', DEFAULT_MAX_RETRIES),
+        backoff=config.get('FETCH_BACKOFF_SECONDS', DEFAULT_BACKOFF_SECONDS),
+        max_staleness=config.get('FEED_MAX_STALENESS', DEFAULT_MAX_STALENESS),
+    )
+
+
+def load_circuit_breaker(config):
+    """Return the process-wide CircuitBreaker configured from config.json settings."""
+    return get_circuit_breaker(
+        failure_threshold=config.get('CIRCUIT_FAILURES', DEFAULT_CIRCUIT_FAILURES),
+        reset_timeout=config.get('CIRCUIT_RESET_SECONDS', DEFAULT_CIRCUIT_RESET_SECONDS),
+    )
+
+
+class FeedResult:
+    """A downloaded (or cached) feed body and, if a parser was supplied, its events.
+
+    stale is True when the download failed and a previously validated
+    cached copy was served instead.
+    """
+
+    __slots__ = ('url', 'text', 'events', 'from_cache', 'stale')
+
+    def __init__(self, url, text, events=None, from_cache=False, stale=False):
+        self.url = url
+        self.text = text
+        self.events = events
+        self.from_cache = from_cache
+        self.stale = stale
+
+
+def _cached_result(url, entry, cache, parse):
+    """Build a FeedResult from a cache entry, parsing the body only if it was cached unparsed."""
+    text = cache.read_body(entry)
+    events = cache.events(entry)
+    if events is None and parse:
+        with metrics.span('feed_parse', host=urlparse(url).netloc):
+            events = parse(text)
+        cache.store_events(url, events)
+    return FeedResult(url, text, events, from_cache=True)
+
+
+def _download(url, host, headers, rate_limiter, policy, breaker):
+    """GET url with timeouts and jittered retries.
+
+    Returns the first response that is not retryable, the last retryable one
+    if all attempts were used, or None if no response was received.
+    """
+    response = None
+    for attempt in range(policy.max_retries + 1):
+        if attempt:
+            # Back off without holding a host slot
+            time.sleep(policy.delay(attempt))
+            metrics.inc('feed_retries_total', host=host)
+        if breaker and not breaker.allow(host):
+            logging.warning(f"Circuit open for {host}, not downloading {url}")
+            metrics.inc('feed_circuit_rejections_total', host=host)
+            return response
+
+        if rate_limiter:
+            rate_limiter.acquire(host)
+        try:
+            logging.info(f"Downloading iCal data from: {url}", extra={'url': url})
+            with metrics.span('feed_fetch', host=host):
+                response = get_session().get(url, headers=headers,
+                                             timeout=(policy.connect_timeout, policy.read_timeout))
+        except requests.RequestException as e:
+            logging.warning(f"Attempt {attempt + 1} to download {url} failed: {e}")
+            response = None
+        finally:
+            if rate_limiter:
+                rate_limiter.release(host)
+
+        if response is not None:
+            metrics.inc('feed_responses_total', host=host, status=response.status_code)
+            if response.status_code not in RETRYABLE_STATUS:
+                if breaker:
+                    breaker.record_success(host)
+                return response
+            logging.warning(f"Attempt {attempt + 1} to download {url} returned status {response.status_code}")
+        if breaker:
+            breaker.record_failure(host)
+    return response
+
+
+def _stale_result(url, entry, cache, parse, policy):
+    """Serve the cached copy of a feed whose download failed, if it is recent enough."""
+    if not entry:
+        return None
+    age = time.time() - entry['fetched_at']
+    if age > policy.max_staleness:
+        logging.error(f"Cached copy of {url} is {age / 3600:.1f} hours old, too stale to use")
+        return None
+    logging.warning(f"Serving cached copy of {url} last validated {age / 3600:.1f} hours ago")
+    metrics.inc('feed_stale_served_total', host=urlparse(url).netloc)
+    result = _cached_result(url, entry, cache, parse)
+    result.stale = True
+    return result
+
+
+def fetch_feed(url, rate_limiter=None, cache=None, parse=None, policy=None, breaker=None):
+    """Download a single iCal feed.
+
+    With a cache, fresh entries are returned without a request and stale ones
+    are revalidated with a conditional GET, so a 304 skips both the download
+    and the parse. Requests use the timeouts and retries of policy (the
+    defaults if None) and are skipped while breaker has the host's circuit
+    open. If the feed cannot be downloaded, a cached copy validated within
+    policy.max_staleness is served instead. Returns a FeedResult, or None
+    on failure.
+    """
+    policy = policy or FetchPolicy()
+    entry = cache.lookup(url) if cache else None
+    host = urlparse(url).netloc
+    if entry and cache.is_fresh(entry):
+        logging.info(f"Using cached iCal data for: {url}", extra={'url': url})
+        metrics.inc('feed_cache_hits_total', host=host, kind='fresh')
+        cache.touch(url)
+        return _cached_result(url, entry, cache, parse)
+
+    try:
+        headers = cache.conditional_headers(entry) if entry else {}
+        response = _download(url, host, headers, rate_limiter, policy, breaker)
+        if response is None:
+            logging.error(f"Failed to download iCal data from {url}")
+            return _stale_result(url, entry, cache, parse, policy)
+
+        if response.status_code == 304 and entry:
+            logging.info(f"iCal data not modified, using cached copy for: {url}", extra={'url': url})
+            metrics.inc('feed_cache_hits_total', host=host, kind='not_modified')
+            cache.touch(url, revalidated=True)
+            return _cached_result(url, entry, cache, parse)
+
+        if response.status_code != 200:
+            logging.error(f"Failed to download iCal data from {url}. Status code: {response.status_code}")
+            return _stale_result(url, entry, cache, parse, policy)
+
+        text = response.text
+        events = None
+        if parse:
+            with metrics.span('feed_parse', host=host):
+                events = parse(text)
+        if cache:
+            cache.store(url, text,
+                        etag=response.headers.get('ETag'),
+                        last_modified=response.headers.get('Last-Modified'),
+                        events=events)
+        return FeedResult(url, text, events)
+    except Exception as e:
+        logging.error(f"Error downloading iCal data from {url}: {e}")
+        return _stale_result(url, entry, cache, parse, policy)
+
+
+def fetch_feeds(urls, max_workers=DEFAULT_MAX_CONCURRENT_FETCHES,
+                per_host_concurrency=DEFAULT_PER_HOST_CONCURRENCY,
+                per_host_interval=DEFAULT_PER_HOST_INTERVAL,
+                cache=None, parse=None, policy=None, breaker=None):
+    """Download many iCal feeds concurrently.
+
+    Returns a dict mapping each URL to its FeedResult (None if the download
+    failed). Duplicate URLs are only downloaded once. If parse is given it is
+    called on each new body and the events are stored in the cache. policy
+    and breaker are passed to fetch_feed.
+    """
+    unique_urls = list(dict.fromkeys(urls))
+    if not unique_urls:
+        return {}
+
+    rate_limiter = HostRateLimiter(per_host_concurrency, per_host_interval)
+    workers = max(1, min(max_workers, len(unique_urls)))
+    get_session(pool_size=workers)
+
+    start_time = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='feed-fetch') as executor:
+        results = dict(zip(unique_urls, executor.map(
+            lambda url: fetch_feed(url, rate_limiter, cache, parse, policy, breaker), unique_urls)))
+
+    if cache:
+        cache.save()
+
+    elapsed = time.monotonic() - start_time
+    logging.info(f"Fetched {len(unique_urls)} feed(s) with {workers} worker(s) in {elapsed:.2f}s")
+    return results
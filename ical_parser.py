@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+import datetime
+import io
+import logging
+
+import pytz
+
+import event_index
+
+# Properties kept for each VEVENT; everything else (DESCRIPTION, DTSTAMP, ...) is skipped
+WANTED_PROPERTIES = ('DTSTART', 'DTEND', 'SUMMARY', 'UID')
+
+
+class UnsupportedFeed(Exception):
+    """Raised when the fast parser meets something it cannot handle exactly like icalendar."""
+
+
+def iter_unfolded_lines(lines):
+    """Yield logical content lines, joining RFC 5545 folded continuation lines."""
+    current = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t'):
+            if current is not None:
+                current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def parse_tzid(params):
+    """Return the timezone named by a TZID parameter, or None if there is none."""
+    for param in params.split(';'):
+        if param.startswith('TZID='):
+            name = param[5:].strip('"')
+            try:
+                return event_index.get_timezone(name)
+            except pytz.UnknownTimeZoneError:
+                # Custom VTIMEZONE definitions need the full parser
+                raise UnsupportedFeed(f"Unknown TZID: {name}")
+    return None
+
+
+def parse_date_value(params, value):
+    """Convert a DTSTART/DTEND value into a date or datetime."""
+    tz = parse_tzid(params) if 'TZID=' in params else None
+    try:
+        # Slicing the fixed-width fields is much cheaper than strptime
+        day = datetime.date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+        if len(value) == 8:
+            return day
+        if value[8] != 'T' or len(value) not in (15, 16):
+            raise ValueError(value)
+        tzinfo = None
+        if len(value) == 16:
+            if value[15] != 'Z':
+                raise ValueError(value)
+            tzinfo = datetime.timezone.utc
+        moment = datetime.datetime(day.year, day.month, day.day,
+                                   int(value[9:11]), int(value[11:13]), int(value[13:15]), tzinfo=tzinfo)
+        if tz is not None and tzinfo is None:
+            return tz.localize(moment)
+        return moment
+    except ValueError:
+        raise UnsupportedFeed(f"Unrecognized date value: {value}")
+
+
+def unescape_text(value):
+    """Undo RFC 5545 TEXT escaping."""
+    if '\\' not in value:
+        return value
+    out = []
+    chars = iter(value)
+    for ch in chars:
+        if ch == '\\':
+            nxt = next(chars, '')
+            out.append('\n' if nxt in ('n', 'N') else nxt)
+        else:
+            out.append(ch)
+    return ''.join(out)
+
+
+def iter_vevents(lines):
+    """Stream VEVENTs out of iCal lines without building a component tree.
+
+    Yields event dicts with uid, summary, start and end. Raises UnsupportedFeed
+    for content that needs the full icalendar parser.
+    """
+    event = None
+    depth = 0
+    for line in iter_unfolded_lines(lines):
+        if line.startswith('BEGIN:'):
+            if line == 'BEGIN:VEVENT':
+                event = {}
+                depth = 0
+            elif event is not None:
+                # Nested component such as VALARM; ignore its properties
+                depth += 1
+            continue
+        if line.startswith('END:'):
+            if event is not None:
+                if depth:
+                    depth -= 1
+                elif line == 'END:VEVENT':
+                    if 'start' not in event or 'end' not in event:
+                        raise UnsupportedFeed("VEVENT without DTSTART/DTEND")
+                    event.setdefault('uid', '')
+                    event.setdefault('summary', '')
+                    yield event
+                    event = None
+            continue
+        if event is None or depth:
+            continue
+
+        name, sep, value = line.partition(':')
+        if not sep:
+            continue
+        name, _, params = name.partition(';')
+        name = name.upper()
+        if name not in WANTED_PROPERTIES:
+            continue
+
+        if name == 'DTSTART':
+            event['start'] = parse_date_value(params, value)
+        elif name == 'DTEND':
+            event['end'] = parse_date_value(params, value)
+        elif name == 'SUMMARY':
+            event['summary'] = unescape_text(value)
+        else:
+            event['uid'] = value
+
+    if event is not None:
+        raise UnsupportedFeed("Unterminated VEVENT")
+
+
+def parse_events_icalendar(ical_text):
+    """Parse iCal text with the full icalendar library."""
+    import icalendar
+
+    cal = icalendar.Calendar.from_ical(ical_text)
+    events = []
+    for component in cal.walk():
+        if component.name == "VEVENT":
+            events.append({
+                'uid': str(component.get('uid', '')),
+                'summary': str(component.get('summary', '')),
+                'start': component.get('dtstart').dt,
+                'end': component.get('dtend').dt,
+            })
+    return events
+
+
+def parse_events(ical_text, fast=True):
+    """Parse iCal text into a list of event dicts with uid, summary, start and end.
+
+    With fast=True the text is streamed through iter_vevents, falling back to
+    icalendar if the feed uses anything the fast path does not support.
+    """
+    if fast:
+        try:
+            return list(iter_vevents(io.StringIO(ical_text)))
+        except UnsupportedFeed as e:
+            logging.info(f"Fast iCal parser fell back to icalendar: {e}")
+    return parse_events_icalendar(ical_text)
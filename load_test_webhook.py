@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import sms_forward
+
+
+def percentile(sorted_values, fraction):
+    """Return the value at fraction (0-1) of an already sorted list."""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def make_in_process_poster(send_delay):
+    """Post to the Flask app in-process, replacing the Twilio call with a fixed delay."""
+    sms_forward.send_forward = lambda from_number, incoming_message: time.sleep(send_delay)
+    local = threading.local()
+
+    def post(i):
+        if not hasattr(local, 'client'):
+            local.client = sms_forward.app.test_client()
+        response = local.client.post('/sms', data={'From': f"+1555{i % 10000:07d}", 'Body': f"Load test {i}"})
+        return response.status_code
+
+    return post
+
+
+def make_http_poster(url):
+    """Post to a running webhook server over HTTP."""
+    import requests
+
+    local = threading.local()
+
+    def post(i):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        response = local.session.post(url, data={'From': f"+1555{i % 10000:07d}", 'Body': f"Load test {i}"})
+        return response.status_code
+
+    return post
+
+
+def run_load_test(post, total, concurrency):
+    """Send total webhook requests with concurrency threads and return latency statistics."""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def one(i):
+        start = time.perf_counter()
+        status = post(i)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': total,
+        'concurrency': concurrency,
+        'wall_seconds': round(wall, 3),
+        'requests_per_second': round(total / wall, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2),
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure /sms webhook latency under load')
+    parser.add_argument('--url', help='Webhook URL of a running server (default: test the app in-process)')
+    parser.add_argument('--requests', type=int, default=2000, help='Total webhook requests to send')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent senders')
+    parser.add_argument('--send-delay', type=float, default=0.3,
+                        help='Simulated Twilio API latency in seconds for in-process runs')
+    args = parser.parse_args()
+
+    post = make_http_poster(args.url) if args.url else make_in_process_poster(args.send_delay)
+    print(json.dumps(run_load_test(post, args.requests, args.concurrency), indent=4))
+
+
+if __name__ == "__main__":
+    main()
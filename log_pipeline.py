@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+import atexit
+import datetime
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+import zlib
+
+# Constants
+DEFAULT_LOG_FILE = 'cleaning_detailed.log'  # JSON lines written by the background log writer
+DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024  # Size at which the log file is rotated
+DEFAULT_LOG_BACKUP_COUNT = 5  # Rotated, gzip-compressed log files to keep
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'  # Console format
+EARLY_RECORDS = 1000  # Records held by hold() until logging is configured
+
+# Structured fields that callers attach with extra={...}; they are written as
+# JSON fields and identify the listing (or feed) a line is about for sampling
+CONTEXT_FIELDS = ('listing', 'url')
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format each record as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(
+                timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class ListingSampler(logging.Filter):
+    """Keep the INFO and DEBUG lines of only a fixed share of listings.
+
+    Whether a listing is sampled depends only on a hash of its name, so the
+    same listings keep their complete logs from run to run. Warnings and
+    errors, and lines not about a particular listing, are always kept.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.threshold = int(rate * 2 ** 32)
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        for field in CONTEXT_FIELDS:
+            key = getattr(record, field, None)
+            if key is not None:
+                return zlib.crc32(str(key).encode('utf-8')) < self.threshold
+        return True
+
+
+class EarlyHandler(logging.Handler):
+    """Keeps the records logged before configure(), such as those of loading config.json."""
+
+    def __init__(self, capacity=EARLY_RECORDS):
+        super().__init__()
+        self.capacity = capacity
+        self.records = []
+
+    def emit(self, record):
+        if len(self.records) < self.capacity:
+            self.records.append(record)
+
+
+def gzip_namer(name):
+    return name + '.gz'
+
+
+def gzip_rotator(source, dest):
+    """Compress a rotated log file, which runs on the writer thread rather than the caller's."""
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def file_handler(config):
+    """Return the rotating JSON file handler described by config.json settings.
+
+    With LOG_ROTATE_WHEN (e.g. 'midnight' or 'H', as for
+    TimedRotatingFileHandler) the file is rotated on that schedule,
+    otherwise whenever it reaches LOG_MAX_BYTES. Rotated files are
+    compressed and LOG_BACKUP_COUNT of them are kept.
+    """
+    path = config.get('LOG_FILE', DEFAULT_LOG_FILE)
+    backups = config.get('LOG_BACKUP_COUNT', DEFAULT_LOG_BACKUP_COUNT)
+    when = config.get('LOG_ROTATE_WHEN')
+    if when:
+        handler = logging.handlers.TimedRotatingFileHandler(path, when=when, backupCount=backups,
+                                                            encoding='utf-8', utc=True)
+    else:
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=config.get('LOG_MAX_BYTES', DEFAULT_LOG_MAX_BYTES),
+                                                       backupCount=backups, encoding='utf-8')
+    handler.namer = gzip_namer
+    handler.rotator = gzip_rotator
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def queue_handler(log_queue, sample_rate):
+    handler = logging.handlers.QueueHandler(log_queue)
+    if sample_rate < 1:
+        handler.addFilter(ListingSampler(sample_rate))
+    return handler
+
+
+def hold(level=logging.INFO):
+    """Keep log records until configure() has set up the handlers, which need the settings to be loaded first."""
+    root = logging.getLogger()
+    root.handlers = [EarlyHandler()]
+    root.setLevel(level)
+
+
+def configure(config, level=logging.INFO):
+    """Route all logging through a queue to a background writer thread.
+
+    Logging calls only put the record on a queue; formatting, writing,
+    rotating and compressing happen on the QueueListener's thread. Lines go
+    to the rotating JSON log file and, if LOG_CONSOLE is set (by default
+    when stderr is a terminal), to stderr as text. LOG_SAMPLE_RATE (0 to 1)
+    keeps the verbose lines of only that share of listings. Records kept
+    by hold() are written first. Calling this again replaces the previous
+    setup. Returns the started QueueListener.
+    """
+    global _listener
+    early = [record for handler in logging.getLogger().handlers if isinstance(handler, EarlyHandler)
+             for record in handler.records]
+    handlers = [file_handler(config)]
+    console = config.get('LOG_CONSOLE')
+    if console if console is not None else sys.stderr.isatty():
+        stream = logging.StreamHandler()
+        stream.setFormatter(logging.Formatter(TEXT_FORMAT))
+        handlers.append(stream)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    shutdown()
+    root.handlers = [queue_handler(log_queue, config.get('LOG_SAMPLE_RATE', 1.0))]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    for record in early:
+        root.handle(record)
+    atexit.unregister(shutdown)
+    atexit.register(shutdown)
+    return _listener
+
+
+def shutdown():
+    """Write out every queued record and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def listen(log_queue):
+    """Start writing the records worker processes put on log_queue to this process's log.
+
+    Returns the QueueListener, to be stopped once the workers are done, or
+    None if logging was not configured with configure().
+    """
+    if _listener is None:
+        return None
+    listener = logging.handlers.QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def forward(log_queue, sample_rate=1.0, level=logging.INFO):
+    """Send a worker process's log records to its parent over log_queue (a multiprocessing queue)."""
+    global _listener
+    _listener = None  # A forked worker inherits the parent's listener, but not its thread
+    root = logging.getLogger()
+    root.handlers = [queue_handler(log_queue, sample_rate)]
+    root.setLevel(level)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+import functools
+import logging
+from concurrent.futures import Future
+
+import metrics
+
+# Constants
+DEFAULT_MAX_SEGMENTS = 10  # Longest message sent in one API call (Twilio recommends at most 10 segments)
+
+# Characters of the GSM 03.38 default alphabet; the extension table costs two septets per character
+GSM7_BASIC = frozenset(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà")
+GSM7_EXTENDED = frozenset("^{}\\[~]|€\f")
+GSM7_CHARS = GSM7_BASIC | GSM7_EXTENDED
+
+# Single-part and per-part capacity of a concatenated message, in characters (septets or UTF-16 units)
+GSM7_LIMITS = (160, 153)
+UCS2_LIMITS = (70, 67)
+
+# Typographic characters that would force the whole message into UCS-2, mapped to GSM-7 lookalikes
+GSM7_SUBSTITUTIONS = str.maketrans({
+    '‘': "'", '’': "'", '“': '"', '”': '"',
+    '–': '-', '—': '-', '…': '...', '\u00a0': ' ',
+})
+
+# Message templates, bound once so each message is a single format call
+REMINDER = "Cleaning needed tomorrow ({day}) at {details}".format
+REMINDER_HEADER = "Cleaning needed tomorrow ({day}) at {count} properties:".format
+REMINDER_ITEM = "{number}. {details}".format
+SAME_DAY_CHECKIN = "{location}. The next guests check in the same day.".format
+CHECKIN_DAY_AFTER = "{location}. Next check-in is the day after tomorrow ({day}).".format
+CHECKIN_IN_DAYS = "{location}. Next check-in is in {days} days ({day}).".format
+NO_CHECKIN = "{location}.".format
+NEW_BOOKING = "New booking at {location}: cleaning needed on {day}.".format
+CANCELLED = "Cancelled: the {day} cleaning at {location} is no longer needed.".format
+MOVED = "Checkout at {location} moved from {old_day} to {new_day}.".format
+UNASSIGNED = "No cleaner available tomorrow ({day}) for: {locations}.".format
+
+
+@functools.lru_cache(maxsize=1024)
+def long_day(date):
+    """Format a date like 'Wednesday, March 12, 2025'."""
+    return date.strftime("%A, %B %d, %Y")
+
+
+@functools.lru_cache(maxsize=1024)
+def short_day(date):
+    """Format a date like 'Wednesday, March 12'."""
+    return date.strftime("%A, %B %d")
+
+
+def describe_turnover(turnover, tomorrow):
+    """Return the property and next check-in part of a reminder for one turnover."""
+    if turnover.next_checkin is None:
+        return NO_CHECKIN(location=turnover.location)
+    if turnover.same_day:
+        return SAME_DAY_CHECKIN(location=turnover.location)
+    days_until_checkin = (turnover.next_checkin - tomorrow).days
+    if days_until_checkin == 1:
+        return CHECKIN_DAY_AFTER(location=turnover.location, day=short_day(turnover.next_checkin))
+    return CHECKIN_IN_DAYS(location=turnover.location, days=days_until_checkin, day=short_day(turnover.next_checkin))
+
+
+def compose_reminder(turnovers, tomorrow):
+    """Compose a single reminder listing all of a cleaner's turnovers tomorrow."""
+    if len(turnovers) == 1:
+        return REMINDER(day=long_day(tomorrow), details=describe_turnover(turnovers[0], tomorrow))
+    lines = [REMINDER_HEADER(day=long_day(tomorrow), count=len(turnovers))]
+    for i, turnover in enumerate(turnovers, 1):
+        lines.append(REMINDER_ITEM(number=i, details=describe_turnover(turnover, tomorrow)))
+    return "\n".join(lines)
+
+
+def is_gsm7(text):
+    return GSM7_CHARS.issuperset(text)
+
+
+def encoded_length(text, gsm7):
+    """Length of text in septets (GSM-7) or UTF-16 code units (UCS-2)."""
+    if gsm7:
+        return len(text) + sum(1 for char in text if char in GSM7_EXTENDED)
+    return len(text.encode('utf-16-le')) // 2
+
+
+def segments_for(length, gsm7):
+    single, multi = GSM7_LIMITS if gsm7 else UCS2_LIMITS
+    if length <= single:
+        return 1
+    return -(-length // multi)
+
+
+def segment_count(text):
+    """Return the number of billable SMS segments needed to send text."""
+    gsm7 = is_gsm7(text)
+    return segments_for(encoded_length(text, gsm7), gsm7)
+
+
+class _Draft:
+    """A message being packed: its parts and lengths under both encodings."""
+
+    __slots__ = ('texts', 'futures', 'gsm7', 'gsm7_length', 'ucs2_length')
+
+    def __init__(self):
+        self.texts = []
+        self.futures = []
+        self.gsm7 = True
+        self.gsm7_length = -1  # No separator before the first part
+        self.ucs2_length = -1
+
+    def segments(self):
+        return segments_for(self.gsm7_length if self.gsm7 else self.ucs2_length, self.gsm7)
+
+    def extended(self, text, gsm7):
+        """Return the (gsm7, gsm7_length, ucs2_length) this draft would have with text appended."""
+        gsm7 = self.gsm7 and gsm7
+        gsm7_length = self.gsm7_length + 1 + encoded_length(text, True) if gsm7 else 0
+        return gsm7, gsm7_length, self.ucs2_length + 1 + encoded_length(text, False)
+
+    def append(self, text, future, state):
+        self.texts.append(text)
+        self.futures.append(future)
+        self.gsm7, self.gsm7_length, self.ucs2_length = state
+
+
+class Outbox:
+    """Collects the messages of one run and sends each recipient the fewest segments.
+
+    Messages added for the same recipient are joined with newlines into one
+    API call whenever that costs no more segments than sending them apart,
+    up to max_segments per call. Typographic quotes and dashes are replaced
+    by GSM-7 characters so a single one does not switch the message to
+    UCS-2, which holds less than half as many characters per segment.
+    """
+
+    def __init__(self, max_segments=DEFAULT_MAX_SEGMENTS):
+        self.max_segments = max_segments
+        self._queued = {}
+
+    def add(self, recipient, text):
+        """Queue text for recipient. Returns a Future resolving to True once the message carrying it is sent."""
+        future = Future()
+        self._queued.setdefault(recipient, []).append((text.translate(GSM7_SUBSTITUTIONS), future))
+        return future
+
+    def __len__(self):
+        return sum(len(parts) for parts in self._queued.values())
+
+    def pack(self, parts):
+        """Group (text, future) parts, in order, into the drafts to send."""
+        drafts = []
+        draft = None
+        for text, future in parts:
+            gsm7 = is_gsm7(text)
+            part_segments = segments_for(encoded_length(text, gsm7), gsm7)
+            if draft is not None:
+                state = draft.extended(text, gsm7)
+                combined = segments_for(state[1] if state[0] else state[2], state[0])
+                if combined <= min(draft.segments() + part_segments, self.max_segments):
+                    draft.append(text, future, state)
+                    continue
+            draft = _Draft()
+            draft.append(text, future, draft.extended(text, gsm7))
+            drafts.append(draft)
+        return drafts
+
+    def flush(self, send=None):
+        """Send everything queued through send(recipient, message) and return the number of messages.
+
+        send may return a bool or a Future resolving to one, as
+        SmsDispatcher.submit does. Without send (a dry run) the messages are
+        only logged.
+        """
+        sent = 0
+        for recipient, parts in self._queued.items():
+            for draft in self.pack(parts):
+                message = "\n".join(draft.texts)
+                segments = draft.segments()
+                sent += 1
+                if send is None:
+                    logging.info(f"[DRY RUN] Would send SMS to {recipient} ({segments} segment(s)): {message}")
+                    resolve(draft.futures, False)
+                    continue
+                metrics.inc('sms_segments_total', segments)
+                resolve(draft.futures, send(recipient, message))
+        self._queued.clear()
+        return sent
+
+
+def resolve(futures, result):
+    """Complete the futures of a draft with a send result (a bool or a Future of one)."""
+    if not hasattr(result, 'add_done_callback'):
+        for future in futures:
+            future.set_result(result)
+        return
+
+    def done(outcome):
+        error = outcome.exception()
+        for future in futures:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(outcome.result())
+
+    result.add_done_callback(done)
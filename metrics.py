@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Constants
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # Seconds
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Thread-safe registry of labelled counters and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        """Add value to the counter name{labels}."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record value in the histogram name{labels}."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Time the enclosed block into {name}_seconds and count failures in {name}_errors_total."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc(f"{name}_errors_total", **labels)
+            raise
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - start, **labels)
+
+    def merge(self, data):
+        """Add metrics exported with to_dict(), e.g. by another shard, into this registry."""
+        with self._lock:
+            for counter in data['counters']:
+                key = (counter['name'], _label_key(counter['labels']))
+                self._counters[key] = self._counters.get(key, 0) + counter['value']
+            for exported in data['histograms']:
+                key = (exported['name'], _label_key(exported['labels']))
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    buckets = tuple(float(bound) for bound in exported['buckets'])
+                    histogram = self._histograms[key] = Histogram(buckets)
+                for i, count in enumerate(exported['buckets'].values()):
+                    histogram.counts[i] += count
+                histogram.sum += exported['sum']
+                histogram.count += exported['count']
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def to_dict(self):
+        """Return all metrics as plain data for JSON export."""
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(key), 'value': value}
+                        for (name, key), value in sorted(self._counters.items())]
+            histograms = [{'name': name, 'labels': dict(key), 'count': h.count, 'sum': h.sum,
+                           'buckets': {str(bound): count for bound, count in zip(h.buckets, h.counts)}}
+                          for (name, key), h in sorted(self._histograms.items())]
+        return {'counters': counters, 'histograms': histograms}
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (counter_name, key), value in sorted(self._counters.items()):
+                    if counter_name == name:
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (histogram_name, key), h in sorted(self._histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    for bound, count in zip(h.buckets, h.counts):
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {h.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {h.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path):
+        """Write metrics to path: Prometheus text for .prom files, JSON otherwise."""
+        with open(path, 'w') as f:
+            if path.endswith('.prom'):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_dict(), f, indent=4)
+        logging.info(f"Wrote metrics to {path}")
+
+
+# Process-wide registry used by the instrumented modules
+METRICS = Metrics()
+span = METRICS.span
+inc = METRICS.inc
+observe = METRICS.observe
+
+
+@contextmanager
+def profiled(profile_path=None, trace_memory=False, top=15):
+    """Optionally run the enclosed block under cProfile and/or tracemalloc.
+
+    cProfile stats are dumped to profile_path (readable with pstats or
+    snakeviz); with trace_memory the top allocation sites are logged.
+    """
+    profiler = None
+    if profile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+            logging.info(f"Wrote profile to {profile_path}")
+        if trace_memory:
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            logging.info(f"Memory: current {current / 1024:.0f} KiB, peak {peak / 1024:.0f} KiB")
+            for stat in snapshot.statistics('lineno')[:top]:
+                logging.info(f"Allocation: {stat}")
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+import contextlib
+import glob
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows; the ledger is then only safe within one process
+    fcntl = None
+
+# Constants
+DEFAULT_LEDGER_FILE = 'notification_ledger.jsonl'  # Append-only record of every reminder sent
+
+PENDING = 'pending'
+SENT = 'sent'
+FAILED = 'failed'
+
+
+class NotificationLedger:
+    """Append-only ledger that makes cleaning reminders idempotent.
+
+    Each reminder is keyed by (listing, checkout date, recipient). Before a
+    message is sent, a pending record is appended and fsync'ed; the outcome is
+    appended once the send finishes. On startup the whole file is replayed
+    into an in-memory dict, so checks are O(1). A reminder whose last record
+    is pending or sent is never sent again, so a crash between the write and
+    the send can lose a reminder but never duplicate one. Failed reminders
+    may be retried by a later run.
+
+    Several processes, such as the shards of a run, can share one ledger:
+    appends and compaction hold an exclusive lock on path + '.lock', and a
+    process reopens the file if another one compacted it in the meantime.
+    Each process only sees the records that existed when it opened the
+    ledger, which is enough as long as no two processes remind the same
+    listing at once. Records in ledgers that shards used to keep
+    separately (e.g. notification_ledger.shard1of4.jsonl) are read too.
+    """
+
+    def __init__(self, path=DEFAULT_LEDGER_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._states = {}
+        self._lock_file = open(self.path + '.lock', 'a')
+        with self._exclusive():
+            self._load()
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        """Hold the lock shared by every process using this ledger."""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _reopen_if_replaced(self):
+        try:
+            replaced = os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except FileNotFoundError:
+            replaced = True
+        if replaced:
+            self._file.close()
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        records = self._replay(self.path, self._states)
+        root, ext = os.path.splitext(self.path)
+        for path in sorted(glob.glob(f"{glob.escape(root)}.shard*of*{glob.escape(ext)}")):
+            states = {}
+            self._replay(path, states)
+            for key, state in states.items():
+                self._states.setdefault(key, state)
+        if records > 2 * len(self._states) + 100:
+            self._compact()
+
+    @staticmethod
+    def _replay(path, states):
+        """Load the latest state of each key in a ledger file into states and return the number of records."""
+        records = 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash mid-write; the send never happened
+                        continue
+                    states[tuple(record['key'])] = record['state']
+                    records += 1
+        except FileNotFoundError:
+            pass
+        return records
+
+    def _compact(self):
+        """Rewrite the ledger with only the latest state of each key."""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for key, state in self._states.items():
+                f.write(json.dumps({'key': list(key), 'state': state}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _append(self, key, state):
+        with self._exclusive():
+            self._reopen_if_replaced()
+            self._file.write(json.dumps({'key': list(key), 'state': state, 'ts': round(time.time(), 3)}) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._states[key] = state
+
+    @staticmethod
+    def make_key(listing, checkout_date, recipient):
+        return (str(listing), checkout_date.isoformat(), str(recipient))
+
+    def already_sent(self, key):
+        return self._states.get(key) in (PENDING, SENT)
+
+    def claim(self, key):
+        """Durably reserve key before sending. Returns False if it was already sent or is in flight."""
+        with self._lock:
+            if self.already_sent(key):
+                return False
+            self._append(key, PENDING)
+            return True
+
+    def reminded(self, checkout_date):
+        """Return {recipient: set of listings} of the reminders sent or in flight for checkout_date."""
+        day = checkout_date.isoformat()
+        recipients = {}
+        with self._lock:
+            for (listing, date, recipient), state in self._states.items():
+                if date == day and state in (PENDING, SENT):
+                    recipients.setdefault(recipient, set()).add(listing)
+        return recipients
+
+    def record(self, key, sent):
+        """Append the outcome of a claimed send."""
+        with self._lock:
+            self._append(key, SENT if sent else FAILED)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            self._lock_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+import bisect
+import csv
+import datetime
+import json
+
+CSV_FIELDS = ('listing', 'location', 'cleaner_phone', 'checkout', 'next_checkin', 'window_days', 'same_day')
+
+
+class Turnover:
+    """A checkout that needs cleaning, and how long the cleaner has before the next check-in."""
+
+    __slots__ = ('listing', 'location', 'cleaner_phone', 'checkout', 'next_checkin')
+
+    def __init__(self, listing, location, cleaner_phone, checkout, next_checkin):
+        self.listing = listing
+        self.location = location
+        self.cleaner_phone = cleaner_phone
+        self.checkout = checkout
+        self.next_checkin = next_checkin
+
+    @property
+    def window_days(self):
+        """Days between checkout and the next check-in, or None if nothing is booked after it."""
+        if self.next_checkin is None:
+            return None
+        return (self.next_checkin - self.checkout).days
+
+    @property
+    def same_day(self):
+        """True if the next guest checks in on the checkout day."""
+        return self.window_days == 0
+
+    def to_dict(self):
+        return {
+            'listing': self.listing,
+            'location': self.location,
+            'cleaner_phone': self.cleaner_phone,
+            'checkout': self.checkout.isoformat(),
+            'next_checkin': self.next_checkin.isoformat() if self.next_checkin else None,
+            'window_days': self.window_days,
+            'same_day': self.same_day,
+        }
+
+
+def plan_listing(listing, index, first_day, horizon):
+    """Return the turnovers of one listing with checkouts in [first_day, first_day + horizon).
+
+    Checkouts and check-ins are both sorted, so the next check-in of each
+    checkout is found by advancing a single pointer through the starts.
+    Several events ending on the same day produce one turnover.
+    """
+    last_day = first_day + datetime.timedelta(days=horizon - 1)
+    checkouts = index.checkouts_between(first_day, last_day)
+    turnovers = []
+    i = bisect.bisect_left(index.starts, first_day)
+    previous_day = None
+    for event in checkouts:
+        if event.end == previous_day:
+            continue
+        previous_day = event.end
+        while i < len(index.starts) and index.starts[i] < event.end:
+            i += 1
+        next_checkin = index.starts[i] if i < len(index.starts) else None
+        turnovers.append(Turnover(listing['NAME'], listing['PROPERTY_LOCATION'], listing['CLEANER_PHONE'],
+                                  event.end, next_checkin))
+    return turnovers
+
+
+def plan_fleet(indexed_listings, horizon):
+    """Plan every (listing, EventIndex, first_day) triple and return all turnovers sorted by checkout date."""
+    turnovers = []
+    for listing, index, first_day in indexed_listings:
+        turnovers.extend(plan_listing(listing, index, first_day, horizon))
+    turnovers.sort(key=lambda turnover: (turnover.checkout, turnover.listing))
+    return turnovers
+
+
+def write_turnovers(turnovers, output, fmt='json'):
+    """Write turnovers to a file object as JSON or CSV."""
+    rows = [turnover.to_dict() for turnover in turnovers]
+    if fmt == 'csv':
+        writer = csv.DictWriter(output, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        json.dump(rows, output, indent=4)
+        output.write('\n')
@@ -1,21 +1,15 @@
 #!/usr/bin/env python
-import json
 import os
-import requests
+
+import feed_cache
+import feed_fetcher
+import settings
 
 def load_config():
-    """Load configuration from config.json file."""
+    """Load configuration from the config.json next to this script."""
     # Get the directory of the script
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    config_path = os.path.join(script_dir, 'config.json')
-    
-    # Load config
-    try:
-        with open(config_path, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error loading config: {e}")
-        return {}
+    return settings.get_settings(os.path.join(script_dir, 'config.json'))
 
 def print_raw_ical_data():
     # Load configuration
@@ -31,10 +25,16 @@ def print_raw_ical_data():
         return
         
     try:
-        # Download the iCal file
+        # Download the iCal file, reusing the cached copy if it has not changed
         print(f"Downloading iCal data from: {ical_url}")
-        response = requests.get(ical_url, verify=False)
-        ical_data = response.content.decode('utf-8')
+        cache = feed_cache.load_feed_cache(config)
+        feed = feed_fetcher.fetch_feed(ical_url, cache=cache, policy=feed_fetcher.load_fetch_policy(config))
+        if cache:
+            cache.save()
+        if feed is None:
+            print("Error: Failed to download iCal data")
+            return
+        ical_data = feed.text
         
         # Print the raw iCal data
         print("\nRAW ICAL DATA:")
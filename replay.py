@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+import argparse
+import bisect
+import datetime
+import json
+import logging
+import os
+import re
+import time
+
+import airbnb_cleaner_notification
+import channel_merge
+import event_index
+import ical_parser
+import message_composer
+import scheduler
+import settings
+
+# Constants
+DEFAULT_RECORDINGS_DIR = 'recordings'  # One directory per listing holding YYYY-MM-DD[.N].ics feed snapshots
+SIMULATED_HOUR = 12  # UTC hour of each simulated run; the same calendar day from UTC-11 to UTC+11
+
+
+def safe_name(name):
+    """Turn a listing NAME into a directory name."""
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', name).strip('_') or 'listing'
+
+
+class Recording:
+    """The recorded feed snapshots of one listing, each parsed into an EventIndex at most once.
+
+    A simulated day sees the latest snapshot recorded on or before it, so a
+    year of daily runs over one snapshot parses that feed a single time. A
+    snapshot holds one feed per channel of the listing, which are merged
+    as in a live run.
+    """
+
+    __slots__ = ('name', 'days', 'loaders', 'indexes', 'tz')
+
+    def __init__(self, snapshots, tz=None, name=''):
+        """snapshots maps the day each snapshot was recorded to a function returning its channels' iCal texts."""
+        self.name = name
+        self.days = sorted(snapshots)
+        self.loaders = [snapshots[day] for day in self.days]
+        self.indexes = [None] * len(self.days)
+        self.tz = tz
+
+    @classmethod
+    def from_text(cls, text, tz=None, day=datetime.date.min, name=''):
+        """A recording with a single one-channel snapshot that applies from day onwards."""
+        return cls({day: lambda: [text]}, tz, name)
+
+    @classmethod
+    def from_directory(cls, directory, tz=None, name=''):
+        """Load the snapshots in directory (bodies are read lazily).
+
+        A snapshot is YYYY-MM-DD.ics for the listing's ICAL_URL plus
+        YYYY-MM-DD.N.ics for the Nth of its ICAL_URLS.
+        """
+        def loader(paths):
+            def load():
+                texts = []
+                for _, path in sorted(paths):
+                    with open(path, 'r', encoding='utf-8') as f:
+                        texts.append(f.read())
+                return texts
+            return load
+
+        channels = {}
+        for filename in os.listdir(directory):
+            stem, ext = os.path.splitext(filename)
+            if ext != '.ics':
+                continue
+            day, _, channel = stem.partition('.')
+            try:
+                day = datetime.date.fromisoformat(day)
+                channel = int(channel or 0)
+            except ValueError:
+                continue
+            channels.setdefault(day, []).append((channel, os.path.join(directory, filename)))
+        return cls({day: loader(paths) for day, paths in channels.items()}, tz, name)
+
+    def index_on(self, day):
+        """Return the EventIndex of the snapshot in effect on day, or None if none was recorded yet."""
+        i = bisect.bisect_right(self.days, day) - 1
+        if i < 0:
+            return None
+        if self.indexes[i] is None:
+            self.indexes[i] = channel_merge.merge_indexes(self.name, [
+                event_index.EventIndex.from_events(ical_parser.parse_events(text), self.tz)
+                for text in self.loaders[i]()])
+        return self.indexes[i]
+
+
+class NullSink:
+    """SMS sink that counts (and optionally keeps) messages instead of sending them."""
+
+    def __init__(self, keep=False):
+        self.messages = [] if keep else None
+        self.count = 0
+        self.segments = 0
+
+    def __call__(self, phone_number, message):
+        self.count += 1
+        self.segments += message_composer.segment_count(message)
+        if self.messages is not None:
+            self.messages.append((phone_number, message))
+        return True
+
+
+def replay(config, listings, recordings, first_day, last_day, clock=None, sink=None):
+    """Run the daily reminder evaluation for each day from first_day to last_day.
+
+    Each day the real evaluation of check_checkout_tomorrow is applied to
+    the snapshot of each listing's recording in effect that day, and the
+    coalesced messages are handed to sink (a NullSink by default) instead of
+    Twilio. The clock starts at noon UTC on first_day and is advanced a day
+    at a time. Returns one dict per day with its turnovers and messages.
+    """
+    clock = clock or scheduler.SimulatedClock(
+        datetime.datetime(first_day.year, first_day.month, first_day.day, SIMULATED_HOUR,
+                          tzinfo=datetime.timezone.utc))
+    sink = sink if sink is not None else NullSink()
+    max_segments = config.get('SMS_MAX_SEGMENTS', message_composer.DEFAULT_MAX_SEGMENTS)
+
+    results = []
+    day = first_day
+    while day <= last_day:
+        indexes = []
+        for listing in listings:
+            index = recordings[listing['NAME']].index_on(day)
+            if index is not None:
+                indexes.append((listing, index))
+
+        outbox = message_composer.Outbox(max_segments)
+        turnovers, unassigned = airbnb_cleaner_notification.evaluate_listings(
+            config, listings, indexes, clock.now(), send=outbox.add)
+        results.append({
+            'day': day.isoformat(),
+            'turnovers': len(turnovers),
+            'unassigned': len(unassigned),
+            'messages': outbox.flush(sink),
+        })
+        day += datetime.timedelta(days=1)
+        clock.advance(datetime.timedelta(days=1))
+    return results
+
+
+def record(config, directory=DEFAULT_RECORDINGS_DIR):
+    """Download the feeds of every listing and save them as today's snapshot in directory.
+
+    A listing is only recorded if the feeds of all its channels were downloaded.
+    """
+    listings = airbnb_cleaner_notification.select_listings(config)
+    feeds = airbnb_cleaner_notification.fetch_listing_feeds(config, listings)
+    saved = 0
+    for listing in listings:
+        channel_feeds = [feeds.get(url) for url in airbnb_cleaner_notification.channel_urls(listing)]
+        if any(feed is None for feed in channel_feeds):
+            continue
+        listing_dir = os.path.join(directory, safe_name(listing['NAME']))
+        os.makedirs(listing_dir, exist_ok=True)
+        day = event_index.local_today(listing['TIMEZONE']).isoformat()
+        for channel, feed in enumerate(channel_feeds):
+            path = os.path.join(listing_dir, f"{day}.{channel}.ics" if channel else f"{day}.ics")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(feed.text)
+        saved += 1
+    print(f"Recorded {saved} of {len(listings)} feed(s) in {directory}")
+
+
+def synthetic_fleet(count, events_per_listing):
+    """Build settings, listings and recordings for count generated listings."""
+    import benchmark
+
+    config = settings.Settings({
+        'CLEANER_PHONE': '+15550000000',
+        'LISTINGS': [{'NAME': f"listing{i}", 'PROPERTY_LOCATION': f"Unit {i}", 'ICAL_URL': f"https://example.invalid/{i}.ics",
+                      'CLEANER_PHONE': f"+1555{i % 50:07d}"}
+                     for i in range(count)],
+    })
+    listings = airbnb_cleaner_notification.get_listings(config)
+    recordings = {listing['NAME']: Recording.from_text(benchmark.generate_feed(events_per_listing, seed_uid=listing['NAME']),
+                                                       name=listing['NAME'])
+                  for listing in listings}
+    return config, listings, recordings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay the daily reminder check over recorded feeds')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    record_parser = subparsers.add_parser('record', help="Save today's feed of every listing as a snapshot")
+    record_parser.add_argument('--dir', default=DEFAULT_RECORDINGS_DIR, help='Recordings directory')
+    run_parser = subparsers.add_parser('run', help='Simulate daily runs over a date range')
+    run_parser.add_argument('--dir', default=DEFAULT_RECORDINGS_DIR, help='Recordings directory')
+    run_parser.add_argument('--from', dest='first_day', type=datetime.date.fromisoformat, required=True,
+                            help='First simulated day, YYYY-MM-DD')
+    run_parser.add_argument('--to', dest='last_day', type=datetime.date.fromisoformat, required=True,
+                            help='Last simulated day, YYYY-MM-DD')
+    run_parser.add_argument('--synthetic', type=int, metavar='N',
+                            help='Replay N generated listings instead of the configured ones')
+    run_parser.add_argument('--events-per-listing', type=int, default=200, help='VEVENTs per generated listing')
+    run_parser.add_argument('--messages', action='store_true', help='Include every message in the output')
+    args = parser.parse_args()
+
+    config = settings.get_settings()
+    if args.command == 'record':
+        record(config, args.dir)
+        return
+
+    if args.synthetic:
+        config, listings, recordings = synthetic_fleet(args.synthetic, args.events_per_listing)
+    else:
+        listings = airbnb_cleaner_notification.select_listings(config)
+        recordings = {listing['NAME']: Recording.from_directory(
+                          os.path.join(args.dir, safe_name(listing['NAME'])),
+                          event_index.get_timezone(listing['TIMEZONE']), listing['NAME'])
+                      for listing in listings
+                      if os.path.isdir(os.path.join(args.dir, safe_name(listing['NAME'])))}
+        listings = [listing for listing in listings if listing['NAME'] in recordings]
+
+    # Keep per-listing log lines out of the simulation
+    logging.getLogger().setLevel(logging.WARNING)
+    sink = NullSink(keep=args.messages)
+    start = time.perf_counter()
+    days = replay(config, listings, recordings, args.first_day, args.last_day, sink=sink)
+    elapsed = time.perf_counter() - start
+
+    report = {
+        'listings': len(listings),
+        'days': len(days),
+        'turnovers': sum(day['turnovers'] for day in days),
+        'unassigned': sum(day['unassigned'] for day in days),
+        'messages': sink.count,
+        'segments': sink.segments,
+        'seconds': elapsed,
+        'per_day': days,
+    }
+    if args.messages:
+        report['sent'] = [{'to': phone_number, 'message': message} for phone_number, message in sink.messages]
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
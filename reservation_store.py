@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+import argparse
+import datetime
+import json
+import logging
+import sqlite3
+import time
+
+import event_index
+import snapshot_store
+
+# Constants
+DEFAULT_DB_FILE = 'reservations.db'  # SQLite database with every event seen in the listings' feeds
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reservations (
+    listing TEXT NOT NULL,
+    key TEXT NOT NULL,
+    uid TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    active INTEGER NOT NULL DEFAULT 1,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (listing, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS reservations_checkout ON reservations (listing, end_date);
+CREATE INDEX IF NOT EXISTS reservations_checkin ON reservations (listing, start_date);
+"""
+
+UPSERT = """
+INSERT INTO reservations (listing, key, uid, start_date, end_date, summary, active, first_seen, last_seen)
+VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)
+ON CONFLICT (listing, key) DO UPDATE SET
+    uid = excluded.uid, start_date = excluded.start_date, end_date = excluded.end_date,
+    summary = excluded.summary, active = 1, last_seen = excluded.last_seen
+"""
+
+COLUMNS = 'uid, start_date, end_date, summary'
+
+
+def to_event(row):
+    """Build an Event from a (uid, start_date, end_date, summary) row."""
+    uid, start, end, summary = row
+    return event_index.Event(datetime.date.fromisoformat(start), datetime.date.fromisoformat(end), uid, summary)
+
+
+class ReservationStore:
+    """SQLite store of every event seen in each listing's feed.
+
+    Feeds are upserted with sync(); writes accumulate in one transaction
+    that is committed by commit() or when the store is closed, so a run
+    over many listings costs a single fsync. The database runs in WAL mode,
+    so reports can read it while a run is writing. Checkout and check-in
+    lookups use the (listing, end_date) and (listing, start_date) indexes.
+    Events that disappear from a feed before their checkout are kept but
+    marked inactive (cancelled); past events stay as history even after
+    Airbnb drops them from the feed.
+    """
+
+    def __init__(self, path=DEFAULT_DB_FILE):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def sync(self, listing, events, today):
+        """Upsert a listing's current events and deactivate upcoming ones no longer in the feed."""
+        now = time.time()
+        self._conn.executemany(UPSERT, (
+            (listing, snapshot_store.event_key(event), event.uid, event.start.isoformat(), event.end.isoformat(),
+             event.summary, now, now)
+            for event in events))
+        cancelled = self._conn.execute(
+            'UPDATE reservations SET active = 0 WHERE listing = ? AND active = 1 AND last_seen < ? AND end_date >= ?',
+            (listing, now, today.isoformat())).rowcount
+        if cancelled:
+            logging.info(f"Marked {cancelled} event(s) at {listing} as no longer in the feed", extra={'listing': listing})
+
+    def commit(self):
+        self._conn.commit()
+
+    def has_listing(self, listing):
+        return self._conn.execute('SELECT 1 FROM reservations WHERE listing = ? LIMIT 1', (listing,)).fetchone() is not None
+
+    def index(self, listing):
+        """Return an EventIndex of the listing's active events, e.g. while its feed is down."""
+        rows = self._conn.execute(f'SELECT {COLUMNS} FROM reservations WHERE listing = ? AND active = 1', (listing,))
+        return event_index.EventIndex([to_event(row) for row in rows])
+
+    def checkouts_on(self, listing, day):
+        """Return the active events checking out on day."""
+        rows = self._conn.execute(
+            f'SELECT {COLUMNS} FROM reservations WHERE listing = ? AND end_date = ? AND active = 1',
+            (listing, day.isoformat()))
+        return [to_event(row) for row in rows]
+
+    def next_checkin_after(self, listing, day):
+        """Return the first active event checking in strictly after day, or None."""
+        row = self._conn.execute(
+            f'SELECT {COLUMNS} FROM reservations WHERE listing = ? AND start_date > ? AND active = 1 '
+            'ORDER BY start_date LIMIT 1',
+            (listing, day.isoformat())).fetchone()
+        return to_event(row) if row else None
+
+    def history(self, listing, first_day, last_day, include_cancelled=True):
+        """Return the events overlapping [first_day, last_day], ordered by check-in."""
+        query = (f'SELECT {COLUMNS} FROM reservations WHERE listing = ? AND start_date <= ? AND end_date >= ?'
+                 + ('' if include_cancelled else ' AND active = 1') + ' ORDER BY start_date')
+        return [to_event(row) for row in self._conn.execute(query, (listing, last_day.isoformat(), first_day.isoformat()))]
+
+    def occupancy(self, listing, first_day, last_day):
+        """Count reserved and blocked nights in [first_day, last_day] and the share of open nights booked."""
+        nights = (last_day - first_day).days + 1
+        reserved = blocked = 0
+        for event in self.history(listing, first_day, last_day, include_cancelled=False):
+            overlap = (min(event.end, last_day + datetime.timedelta(days=1)) - max(event.start, first_day)).days
+            if overlap <= 0:
+                continue
+            if event_index.is_reservation(event.summary):
+                reserved += overlap
+            else:
+                blocked += overlap
+        available = nights - blocked
+        return {
+            'listing': listing,
+            'first_day': first_day.isoformat(),
+            'last_day': last_day.isoformat(),
+            'nights': nights,
+            'reserved_nights': reserved,
+            'blocked_nights': blocked,
+            'occupancy': reserved / available if available > 0 else 0.0,
+        }
+
+    def listings(self):
+        return [row[0] for row in self._conn.execute('SELECT DISTINCT listing FROM reservations ORDER BY listing')]
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def load_reservation_store(config):
+    """Open the ReservationStore named by config.json settings."""
+    return ReservationStore(config.get('RESERVATION_DB', DEFAULT_DB_FILE))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report on the reservations stored by the cleaning reminder')
+    parser.add_argument('report', choices=['occupancy', 'history'], help='Report to print as JSON')
+    parser.add_argument('--db', default=DEFAULT_DB_FILE, help='Reservation database file')
+    parser.add_argument('--listing', action='append', help='Listing NAME to report on (default: all)')
+    parser.add_argument('--from', dest='first_day', type=datetime.date.fromisoformat,
+                        help='First day, YYYY-MM-DD (default: today)')
+    parser.add_argument('--to', dest='last_day', type=datetime.date.fromisoformat,
+                        help='Last day, YYYY-MM-DD (default: 30 days after --from)')
+    args = parser.parse_args()
+
+    first_day = args.first_day or datetime.date.today()
+    last_day = args.last_day or first_day + datetime.timedelta(days=30)
+    with ReservationStore(args.db) as store:
+        listings = args.listing or store.listings()
+        if args.report == 'occupancy':
+            report = [store.occupancy(listing, first_day, last_day) for listing in listings]
+        else:
+            report = {listing: [{'uid': event.uid, 'start': event.start.isoformat(), 'end': event.end.isoformat(),
+                                 'summary': event.summary}
+                                for event in store.history(listing, first_day, last_day)]
+                      for listing in listings}
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+import datetime
+import heapq
+import json
+import logging
+import os
+
+import pytz
+
+# Constants
+DEFAULT_TIMEZONE = 'America/Los_Angeles'  # Properties are in Pacific time unless configured otherwise
+DEFAULT_NOTIFY_TIME = '16:45'  # Local time of day the cleaner is notified
+DEFAULT_STATE_FILE = 'scheduler_state.json'  # Where next fire times are persisted between restarts
+
+
+def next_fire_time(after, timezone, notify_time):
+    """Return the first UTC datetime after `after` that is notify_time (HH:MM) in timezone.
+
+    Computing the fire time in the property's own timezone keeps the local
+    notification time fixed across DST changes.
+    """
+    tz = pytz.timezone(timezone)
+    hour, minute = (int(part) for part in notify_time.split(':'))
+    local_day = after.astimezone(tz).date()
+    for offset in range(3):
+        day = local_day + datetime.timedelta(days=offset)
+        local = tz.localize(datetime.datetime(day.year, day.month, day.day, hour, minute), is_dst=False)
+        fire_at = local.astimezone(pytz.utc)
+        if fire_at > after:
+            return fire_at
+    raise ValueError(f"Could not compute next fire time for {notify_time} in {timezone}")
+
+
+class SystemClock:
+    """The real time, in UTC."""
+
+    def now(self):
+        return datetime.datetime.now(datetime.timezone.utc)
+
+
+class SimulatedClock:
+    """A clock that only moves when advanced, for replaying past or future days."""
+
+    def __init__(self, start):
+        self._now = start
+
+    def now(self):
+        return self._now
+
+    def advance(self, delta):
+        self._now += delta
+
+
+SYSTEM_CLOCK = SystemClock()
+
+
+class Scheduler:
+    """Timer queue of per-listing fire times backed by a heap.
+
+    Fire times are persisted to a JSON state file after every change, so a
+    restarted daemon resumes the same schedule and immediately runs any
+    check it missed while it was down.
+    """
+
+    def __init__(self, state_path=DEFAULT_STATE_FILE):
+        self.state_path = state_path
+        self._heap = []
+        self._next = {}
+        self._load_state()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logging.error(f"Error loading scheduler state, starting fresh: {e}")
+            return
+        for key, fire_at in state.items():
+            self._push(key, datetime.datetime.fromisoformat(fire_at))
+        logging.info(f"Restored {len(self._next)} scheduled check(s) from {self.state_path}")
+
+    def _save_state(self):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({key: fire_at.isoformat() for key, fire_at in self._next.items()}, f, indent=4)
+        os.replace(tmp_path, self.state_path)
+
+    def _push(self, key, fire_at):
+        self._next[key] = fire_at
+        heapq.heappush(self._heap, (fire_at, key))
+
+    def __contains__(self, key):
+        return key in self._next
+
+    def keys(self):
+        return list(self._next)
+
+    def schedule(self, key, fire_at):
+        """Set the next fire time for key, replacing any earlier one."""
+        self._push(key, fire_at)
+        self._save_state()
+
+    def remove(self, key):
+        """Stop scheduling key; its stale heap entry is skipped when popped."""
+        if self._next.pop(key, None) is not None:
+            self._save_state()
+
+    def next_fire(self):
+        """Return the earliest pending fire time, or None if nothing is scheduled."""
+        while self._heap and self._next.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """Remove and return the keys whose fire time is at or before now.
+
+        The keys stay in the persisted state until they are rescheduled, so a
+        crash while handling them causes a catch-up run after restart.
+        """
+        due = []
+        while self.next_fire() is not None and self._heap[0][0] <= now:
+            fire_at, key = heapq.heappop(self._heap)
+            due.append(key)
+        return due
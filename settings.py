@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+import json
+import logging
+import os
+import re
+import threading
+
+# Constants
+DEFAULT_CONFIG_PATH = 'config.json'
+SECRET_KEYS = ('D7_API_TOKEN', 'TWILIO_AUTH_TOKEN')  # Masked when the configuration is logged
+
+# Typed attributes exposed on Settings, keyed by their config.json name
+FIELDS = {
+    'ICAL_URL': 'ical_url',
+    'CLEANER_PHONE': 'cleaner_phone',
+    'PERSONAL_PHONE': 'personal_phone',
+    'PROPERTY_LOCATION': 'property_location',
+    'TWILIO_ACCOUNT_SID': 'twilio_account_sid',
+    'TWILIO_AUTH_TOKEN': 'twilio_auth_token',
+    'TWILIO_PHONE_NUMBER': 'twilio_phone_number',
+    'D7_API_TOKEN': 'd7_api_token',
+    'LISTINGS': 'listings',
+    'CLEANERS': 'cleaners',
+}
+
+# Optional tuning settings and the type they are coerced to
+NUMERIC_KEYS = {
+    'MAX_CONCURRENT_FETCHES': int,
+    'PER_HOST_CONCURRENCY': int,
+    'PER_HOST_INTERVAL': float,
+    'FEED_CACHE_TTL': float,
+    'FEED_CACHE_MAX_BYTES': int,
+    'FEED_MAX_STALENESS': float,
+    'FETCH_CONNECT_TIMEOUT': float,
+    'FETCH_READ_TIMEOUT': float,
+    'FETCH_MAX_RETRIES': int,
+    'FETCH_BACKOFF_SECONDS': float,
+    'CIRCUIT_FAILURES': int,
+    'CIRCUIT_RESET_SECONDS': float,
+    'SMS_MAX_WORKERS': int,
+    'SMS_RATE_PER_SECOND': float,
+    'SMS_BURST': int,
+    'SMS_MAX_RETRIES': int,
+    'SMS_BACKOFF_SECONDS': float,
+    'SMS_MAX_SEGMENTS': int,
+    'SMS_FAILOVER_SLOW_SECONDS': float,
+    'SMS_FAILOVER_FAILURES': int,
+    'SMS_FAILOVER_COOLDOWN': float,
+    'FORWARD_WORKERS': int,
+    'FORWARD_QUEUE_SIZE': int,
+    'CHANGE_WINDOW_DAYS': int,
+    'LOG_MAX_BYTES': int,
+    'LOG_BACKUP_COUNT': int,
+    'LOG_SAMPLE_RATE': float,
+    'DELIVERY_STUCK_MINUTES': float,
+}
+
+PHONE_PATTERN = re.compile(r'^\+[1-9]\d{6,14}$')
+SMS_PROVIDER_NAMES = ('twilio', 'd7', 'fake')  # Allowed entries of SMS_PROVIDERS
+
+
+class Settings:
+    """Validated contents of config.json.
+
+    The core settings are available as attributes (e.g. settings.ical_url).
+    Every key, including optional tuning keys, can also be read dict-style
+    with settings.get(KEY, default), so code written against the raw config
+    dict keeps working.
+    """
+
+    __slots__ = tuple(FIELDS.values()) + ('raw', 'path', 'errors')
+
+    def __init__(self, raw, path=DEFAULT_CONFIG_PATH):
+        self.path = path
+        self.errors = []
+        self.raw = self._validate(dict(raw))
+        for key, attr in FIELDS.items():
+            setattr(self, attr, self.raw.get(key))
+
+    def _validate(self, raw):
+        for key, kind in NUMERIC_KEYS.items():
+            if key in raw:
+                try:
+                    raw[key] = kind(raw[key])
+                except (TypeError, ValueError):
+                    self.errors.append(f"{key} must be a number, got {raw[key]!r}")
+                    del raw[key]
+
+        for key in ('ICAL_URL', 'STATUS_CALLBACK_URL', 'D7_REPORT_URL'):
+            url = raw.get(key)
+            if url and not str(url).startswith(('http://', 'https://')):
+                self.errors.append(f"{key} is not a valid URL: {url}")
+
+        urls = raw.get('ICAL_URLS')
+        if urls is not None and not self._valid_urls(urls):
+            self.errors.append(f"ICAL_URLS must be a list of URLs: {urls}")
+            del raw['ICAL_URLS']
+
+        providers = raw.get('SMS_PROVIDERS')
+        if providers is not None and not (isinstance(providers, list) and providers
+                                          and all(name in SMS_PROVIDER_NAMES for name in providers)):
+            self.errors.append(f"SMS_PROVIDERS must be a list of {', '.join(SMS_PROVIDER_NAMES)}: {providers}")
+            del raw['SMS_PROVIDERS']
+
+        for key in ('CLEANER_PHONE', 'PERSONAL_PHONE', 'TWILIO_PHONE_NUMBER'):
+            phone = raw.get(key)
+            if phone and not PHONE_PATTERN.match(str(phone)):
+                self.errors.append(f"{key} is not in international format (+1234567890): {phone}")
+
+        listings = raw.get('LISTINGS')
+        if listings is not None and not (isinstance(listings, list) and all(isinstance(e, dict) for e in listings)):
+            self.errors.append("LISTINGS must be a list of objects")
+            del raw['LISTINGS']
+        elif listings is not None:
+            for entry in listings:
+                if entry.get('ICAL_URLS') is not None and not self._valid_urls(entry['ICAL_URLS']):
+                    self.errors.append(f"ICAL_URLS of listing {entry.get('NAME', entry.get('PROPERTY_LOCATION'))} "
+                                       f"must be a list of URLs: {entry['ICAL_URLS']}")
+                    del entry['ICAL_URLS']
+
+        cleaners = raw.get('CLEANERS')
+        if cleaners is not None:
+            if not (isinstance(cleaners, list) and all(isinstance(e, dict) for e in cleaners)):
+                self.errors.append("CLEANERS must be a list of objects")
+                del raw['CLEANERS']
+            elif not all(PHONE_PATTERN.match(str(e.get('PHONE', ''))) for e in cleaners):
+                self.errors.append("Every CLEANERS entry needs a PHONE in international format (+1234567890)")
+                del raw['CLEANERS']
+            else:
+                for entry in cleaners:
+                    if entry.get('CAPACITY') is not None:
+                        try:
+                            entry['CAPACITY'] = int(entry['CAPACITY'])
+                        except (TypeError, ValueError):
+                            self.errors.append(f"CAPACITY of cleaner {entry['PHONE']} must be a number")
+                            del entry['CAPACITY']
+
+        for error in self.errors:
+            logging.error(f"Invalid configuration in {self.path}: {error}")
+        return raw
+
+    @staticmethod
+    def _valid_urls(urls):
+        return isinstance(urls, list) and all(str(url).startswith(('http://', 'https://')) for url in urls)
+
+    def get(self, key, default=None):
+        return self.raw.get(key, default)
+
+    def __getitem__(self, key):
+        return self.raw[key]
+
+    def __contains__(self, key):
+        return key in self.raw
+
+    def replace(self, **values):
+        """Return a copy with some keys set to already valid values, without validating again."""
+        copy = Settings.__new__(Settings)
+        copy.path = self.path
+        copy.errors = self.errors
+        copy.raw = dict(self.raw, **values)
+        for key, attr in FIELDS.items():
+            setattr(copy, attr, copy.raw.get(key))
+        return copy
+
+    def masked(self):
+        """Return the raw settings with secrets replaced by ***."""
+        return {k: '***' if k in SECRET_KEYS else v for k, v in self.raw.items()}
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_settings(path=DEFAULT_CONFIG_PATH):
+    """Return the Settings for path, re-reading the file only when it has changed.
+
+    The file is stat'ed on each call; it is parsed and validated again only
+    if its modification time or size differs from the cached copy. A missing
+    or unreadable file yields empty settings, matching the old load_config,
+    and is reported once rather than on every call.
+    """
+    abs_path = os.path.abspath(path)
+    try:
+        stat = os.stat(abs_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+    except OSError as e:
+        signature, missing = None, e
+
+    with _cache_lock:
+        cached = _cache.get(abs_path)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        if signature is None:
+            logging.error(f"Error loading config: {missing}")
+            settings = Settings({}, path)
+        else:
+            try:
+                with open(abs_path, 'r') as f:
+                    settings = Settings(json.load(f), path)
+            except Exception as e:
+                logging.error(f"Error loading config: {e}")
+                settings = cached[1] if cached else Settings({}, path)
+            else:
+                logging.info(f"Loaded configuration: {json.dumps(settings.masked())}")
+
+        _cache[abs_path] = (signature, settings)
+        return settings
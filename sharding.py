@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+import bisect
+import functools
+import hashlib
+import os
+
+import feed_cache
+import reservation_store
+import scheduler
+
+# Constants
+DEFAULT_REPLICAS = 128  # Virtual nodes per shard on the hash ring; more gives a more even split
+
+# Settings naming the files and directories that each shard keeps separately.
+# The notification ledger is not among them: it is shared by every shard, so
+# a listing that moves to another shard keeps its record of sent reminders.
+PARTITIONED_PATHS = {
+    'FEED_CACHE_DIR': feed_cache.DEFAULT_CACHE_DIR,
+    'RESERVATION_DB': reservation_store.DEFAULT_DB_FILE,
+    'SCHEDULER_STATE_FILE': scheduler.DEFAULT_STATE_FILE,
+}
+
+
+def stable_hash(key):
+    """64-bit hash of a string that is the same in every process and on every host."""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent hash ring mapping keys to shard numbers.
+
+    Each shard owns replicas points on the ring, and a key belongs to the
+    first point at or after its hash. Going from N to N+1 shards moves only
+    about 1/(N+1) of the keys, so most listings keep their shard (and the
+    feed cache and reservation database partition that goes with it).
+    """
+
+    def __init__(self, count, replicas=DEFAULT_REPLICAS):
+        points = sorted((stable_hash(f"shard-{shard}-{replica}"), shard)
+                        for shard in range(count) for replica in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, key):
+        i = bisect.bisect_left(self._hashes, stable_hash(key))
+        return self._shards[i % len(self._shards)]
+
+
+@functools.lru_cache(maxsize=None)
+def get_ring(count):
+    return HashRing(count)
+
+
+class Shard:
+    """One of count workers, numbered from 0, that checks its share of the listings.
+
+    Listings are assigned by their AREA so that all properties a cleaner
+    covers in one area are routed together.
+    """
+
+    __slots__ = ('index', 'count')
+
+    def __init__(self, index, count):
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"Invalid shard {index}/{count}")
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def parse(cls, spec):
+        """Parse 'i/N' as shard i of N."""
+        try:
+            index, count = (int(part) for part in spec.split('/'))
+        except ValueError:
+            raise ValueError(f"Shard must be given as i/N, got {spec!r}")
+        return cls(index, count)
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+    def owns(self, listing):
+        return get_ring(self.count).shard_for(listing['AREA']) == self.index
+
+    def select(self, listings):
+        return [listing for listing in listings if self.owns(listing)]
+
+    def path(self, path):
+        """Return this shard's partition of a file or directory, e.g. reservations.shard1of4.db."""
+        root, ext = os.path.splitext(path)
+        return f"{root}.shard{self.index}of{self.count}{ext}"
+
+    def settings(self, config):
+        """Return config with the cache, database and scheduler state moved to this shard's partition."""
+        return config.replace(**{key: self.path(config.get(key, default))
+                                 for key, default in PARTITIONED_PATHS.items()})
+
+
+def split_cleaners(cleaners, listings, count):
+    """Return the cleaners (see cleaner_routing) who serve listings in more than one of count shards."""
+    ring = get_ring(count)
+    return [cleaner for cleaner in cleaners
+            if len({ring.shard_for(listing['AREA']) for listing in listings if cleaner.serves(listing['AREA'])}) > 1]
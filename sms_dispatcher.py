@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Constants
+DEFAULT_MAX_WORKERS = 8  # Messages in flight at the same time
+DEFAULT_RATE_PER_SECOND = 1.0  # Twilio's default throughput for a single long-code number
+DEFAULT_BURST = 1  # Messages that may be sent back to back before throttling kicks in
+DEFAULT_MAX_RETRIES = 3  # Retries after the first attempt for 429/5xx responses
+DEFAULT_BACKOFF_SECONDS = 1.0  # Base delay for exponential backoff between retries
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_twilio_client(account_sid, auth_token):
+    """Return a process-wide Twilio client whose HTTP connections are pooled and reused."""
+    key = (account_sid, auth_token)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            from twilio.http.http_client import TwilioHttpClient
+            from twilio.rest import Client
+
+            client = Client(account_sid, auth_token, http_client=TwilioHttpClient(pool_connections=True))
+            _clients[key] = client
+        return client
+
+
+def set_twilio_client(account_sid, auth_token, client):
+    """Install a preconfigured client for an account, e.g. one pointed at a mock server."""
+    with _clients_lock:
+        _clients[(account_sid, auth_token)] = client
+
+
+def is_retryable(error):
+    """True for rate limiting, server errors and connection problems."""
+    status = getattr(error, 'status', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (ConnectionError, TimeoutError)) or \
+        type(error).__name__ in ('ConnectionError', 'Timeout', 'ReadTimeout', 'ConnectTimeout')
+
+
+class TokenBucket:
+    """Thread-safe token bucket used to stay within a sending number's rate limit."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class SmsDispatcher:
+    """Sends queued messages concurrently with throttling and retries.
+
+    `send` is called as send(phone_number, message) and must raise on
+    failure. Failed sends with a retryable error are retried with jittered
+    exponential backoff. Per-message latency (including throttling and
+    retries) is recorded for stats().
+    """
+
+    def __init__(self, send, max_workers=DEFAULT_MAX_WORKERS, rate=DEFAULT_RATE_PER_SECOND,
+                 burst=DEFAULT_BURST, max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF_SECONDS):
+        self.send = send
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._bucket = TokenBucket(rate, burst)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sms-dispatch')
+        self._lock = threading.Lock()
+        self._latencies = []
+        self._sent = 0
+        self._failed = 0
+        self._retries = 0
+
+    def submit(self, phone_number, message):
+        """Queue a message and return a Future that resolves to True if it was sent."""
+        return self._executor.submit(self._deliver, phone_number, message, time.monotonic())
+
+    def _deliver(self, phone_number, message, queued_at):
+        attempt = 0
+        while True:
+            self._bucket.acquire()
+            try:
+                self.send(phone_number, message)
+                self._record(queued_at, sent=True)
+                return True
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    logging.error(f"Error sending SMS to {phone_number}: {e}")
+                    self._record(queued_at, sent=False)
+                    return False
+                delay = self.backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+                attempt += 1
+                with self._lock:
+                    self._retries += 1
+                logging.warning(f"Retrying SMS to {phone_number} in {delay:.1f}s (attempt {attempt}): {e}")
+                time.sleep(delay)
+
+    def _record(self, queued_at, sent):
+        with self._lock:
+            self._latencies.append(time.monotonic() - queued_at)
+            if sent:
+                self._sent += 1
+            else:
+                self._failed += 1
+
+    def stats(self):
+        """Return counts and latency percentiles (seconds) for the messages handled so far."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {'sent': self._sent, 'failed': self._failed, 'retries': self._retries}
+        if latencies:
+            stats['latency_p50'] = latencies[len(latencies) // 2]
+            stats['latency_p95'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            stats['latency_max'] = latencies[-1]
+        return stats
+
+    def close(self):
+        """Wait for every queued message and shut down the worker pool."""
+        self._executor.shutdown(wait=True)
+        stats = self.stats()
+        if stats['sent'] or stats['failed']:
+            logging.info(f"SMS dispatch finished: {stats}")
+        return stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def create_dispatcher(config, send):
+    """Create an SmsDispatcher using the SMS_* throttling settings from config.json."""
+    return SmsDispatcher(
+        send,
+        max_workers=config.get('SMS_MAX_WORKERS', DEFAULT_MAX_WORKERS),
+        rate=config.get('SMS_RATE_PER_SECOND', DEFAULT_RATE_PER_SECOND),
+        burst=config.get('SMS_BURST', DEFAULT_BURST),
+        max_retries=config.get('SMS_MAX_RETRIES', DEFAULT_MAX_RETRIES),
+        backoff=config.get('SMS_BACKOFF_SECONDS', DEFAULT_BACKOFF_SECONDS),
+    )
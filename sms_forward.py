@@ -1,58 +1,170 @@
 #!/usr/bin/env python
 from flask import Flask, request, Response
 from twilio.twiml.messaging_response import MessagingResponse
-import json
+import argparse
+import logging
 import os
-from twilio.rest import Client
+import queue
+import threading
+
+import delivery_store
+import log_pipeline
+import metrics
+import settings
+import sms_providers
 
 app = Flask(__name__)
 
-# Load configuration
-def load_config():
-    try:
-        with open('config.json', 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error loading config: {e}")
-        return {}
+# Constants
+DEFAULT_FORWARD_WORKERS = 4  # Background threads sending forwarded messages
+DEFAULT_FORWARD_QUEUE_SIZE = 100  # Messages waiting to be forwarded before the webhook pushes back
+DEFAULT_FORWARD_LOG_FILE = 'sms_forward.log'  # JSON lines of the webhook, kept apart from the reminder runs' log
+
+_forward_queue = None
+_forward_lock = threading.Lock()
+
+
+def send_forward(from_number, incoming_message):
+    """Forward one incoming message to your personal number through the configured SMS provider."""
+    # Load config (cached; only re-read when config.json changes)
+    config = settings.get_settings()
+
+    # Your personal number to forward to
+    your_personal_number = config.personal_phone or '+14253012277'  # Default to the cleaner number if not set
+
+    # Forward the message to your personal number
+    sms_providers.get_provider(config).send(your_personal_number, f"From: {from_number}\n\n{incoming_message}")
+
+
+def forward_worker(work_queue):
+    """Send queued forwards until the process exits."""
+    while True:
+        from_number, incoming_message = work_queue.get()
+        try:
+            with metrics.span('forward_send'):
+                send_forward(from_number, incoming_message)
+            metrics.inc('forwards_total', result='sent')
+        except Exception as e:
+            metrics.inc('forwards_total', result='failed')
+            logging.error(f"Error forwarding SMS from {from_number}: {e}")
+        finally:
+            work_queue.task_done()
+
+
+def get_forward_queue():
+    """Return the bounded forward queue, starting its worker threads on first use."""
+    global _forward_queue
+    with _forward_lock:
+        if _forward_queue is None:
+            config = settings.get_settings()
+            work_queue = queue.Queue(maxsize=config.get('FORWARD_QUEUE_SIZE', DEFAULT_FORWARD_QUEUE_SIZE))
+            for i in range(config.get('FORWARD_WORKERS', DEFAULT_FORWARD_WORKERS)):
+                threading.Thread(target=forward_worker, args=(work_queue,), name=f"sms-forward-{i}",
+                                 daemon=True).start()
+            _forward_queue = work_queue
+        return _forward_queue
+
 
 @app.route("/sms", methods=['POST'])
 def sms_reply():
-    """Respond to incoming SMS messages and forward them to your personal number"""
+    """Respond to incoming SMS messages and forward them to your personal number
+
+    The forward is handed to a background worker so the webhook returns
+    immediately. When the queue is full the webhook answers 503, and Twilio
+    retries it later instead of piling up blocked request threads.
+    """
     # Get the message the user sent our Twilio number
     incoming_message = request.values.get('Body', '')
     # Get the number the message was sent from
     from_number = request.values.get('From', '')
-    
-    # Load config
-    config = load_config()
-    
-    # Get Twilio credentials
-    account_sid = config.get('TWILIO_ACCOUNT_SID')
-    auth_token = config.get('TWILIO_AUTH_TOKEN')
-    twilio_number = config.get('TWILIO_PHONE_NUMBER')
-    
-    # Your personal number to forward to
-    your_personal_number = config.get('PERSONAL_PHONE', '+14253012277')  # Default to the cleaner number if not set
-    
-    # Create Twilio client
-    client = Client(account_sid, auth_token)
-    
-    # Forward the message to your personal number
-    client.messages.create(
-        body=f"From: {from_number}\n\n{incoming_message}",
-        from_=twilio_number,
-        to=your_personal_number
-    )
-    
+
+    try:
+        get_forward_queue().put_nowait((from_number, incoming_message))
+    except queue.Full:
+        logging.warning(f"Forward queue full, rejecting SMS from {from_number}")
+        metrics.inc('webhook_requests_total', status=503)
+        return Response("Forward queue full", status=503, headers={'Retry-After': '5'})
+    metrics.inc('webhook_requests_total', status=200)
+
     # Create a response
     resp = MessagingResponse()
-    
+
     # You can add a reply message if you want the sender to get an auto-response
     # resp.message("Thanks for your message! It has been forwarded.")
-    
-    return str(resp)
+
+    return Response(str(resp), mimetype='application/xml')
+
+
+def is_from_twilio(config):
+    """Check the X-Twilio-Signature of a status callback against the URL it was sent to.
+
+    That is STATUS_CALLBACK_URL when it is set, which also works behind a
+    proxy that changes the scheme or host, and otherwise the URL of the
+    request.
+    """
+    from twilio.request_validator import RequestValidator
+
+    validator = RequestValidator(config.twilio_auth_token)
+    return validator.validate(config.get('STATUS_CALLBACK_URL') or request.url, request.form,
+                              request.headers.get('X-Twilio-Signature', ''))
+
+
+@app.route("/status", methods=['POST'])
+def status_callback():
+    """Record a delivery status update that Twilio posts for a message sent with a StatusCallback.
+
+    The update is queued on the delivery store's batch writer, so the
+    request returns without waiting for the database. Whenever
+    TWILIO_AUTH_TOKEN is set, updates without a valid Twilio signature are
+    rejected, since these statuses decide what --resend-undelivered sends.
+    """
+    config = settings.get_settings()
+    if config.twilio_auth_token and not is_from_twilio(config):
+        logging.warning(f"Rejected status callback with an invalid signature from {request.remote_addr}")
+        metrics.inc('status_callbacks_total', status='rejected')
+        return Response("Invalid signature", status=403)
+
+    sid = request.values.get('MessageSid')
+    status = request.values.get('MessageStatus')
+    if not sid or not status:
+        metrics.inc('status_callbacks_total', status='invalid')
+        return Response("MessageSid and MessageStatus are required", status=400)
+
+    delivery_store.get_delivery_store(config).record_status(
+        sid, status, request.values.get('ErrorCode'), request.values.get('To'))
+    metrics.inc('status_callbacks_total', status=status)
+    return Response(status=204)
+
+
+@app.route("/metrics", methods=['GET'])
+def metrics_endpoint():
+    """Expose webhook and forwarding metrics in the Prometheus text format."""
+    return Response(metrics.METRICS.to_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Twilio SMS forwarding webhook')
+    parser.add_argument('--host', default='0.0.0.0', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)), help='Port to listen on')
+    parser.add_argument('--debug', action='store_true', help="Run Flask's debug server instead of waitress")
+    args = parser.parse_args()
+
+    # The webhook runs next to the reminder runs, so it rotates a log file of its own
+    log_pipeline.hold()
+    config = settings.get_settings()
+    log_pipeline.configure(config.replace(LOG_FILE=config.get('FORWARD_LOG_FILE', DEFAULT_FORWARD_LOG_FILE)))
+
+    if args.debug:
+        app.run(debug=True, host=args.host, port=args.port)
+        return
+
+    try:
+        from waitress import serve
+    except ImportError:
+        logging.error("waitress is not installed; run 'pip install -r requirements.txt' or use --debug")
+        return
+    serve(app, host=args.host, port=args.port, threads=8)
+
 
 if __name__ == "__main__":
-    # Run the Flask app when this file is executed directly
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+import itertools
+import logging
+import random
+import threading
+import time
+
+import metrics
+import sms_dispatcher
+
+# Constants
+DEFAULT_PROVIDERS = ('twilio',)  # SMS_PROVIDERS in order of preference
+D7_API_URL = 'https://api.d7networks.com/messages/v1/send'
+DEFAULT_D7_ORIGINATOR = 'AirbnbClean'
+DEFAULT_D7_TIMEOUT = 10  # Seconds to wait for the D7 API
+DEFAULT_SLOW_SECONDS = 2.0  # Average send latency above which traffic moves to the next provider
+DEFAULT_FAILOVER_FAILURES = 3  # Consecutive failures after which a provider is taken out of rotation
+DEFAULT_FAILOVER_COOLDOWN = 60.0  # Seconds before a failing or slow provider gets another chance
+LATENCY_WEIGHT = 0.2  # Weight of the newest send in a provider's moving-average latency
+
+# config.json keys the providers are created from; a change to any of them creates new providers
+PROVIDER_KEYS = ('TWILIO_ACCOUNT_SID', 'TWILIO_AUTH_TOKEN', 'TWILIO_PHONE_NUMBER', 'D7_API_TOKEN', 'D7_ORIGINATOR',
+                 'D7_REPORT_URL', 'SMS_MAX_WORKERS', 'SMS_FAILOVER_SLOW_SECONDS', 'SMS_FAILOVER_FAILURES',
+                 'SMS_FAILOVER_COOLDOWN')
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+class ProviderError(Exception):
+    """A provider's API rejected a message; status is the HTTP status code, as on Twilio's errors."""
+
+    def __init__(self, provider, status, detail=''):
+        super().__init__(f"{provider} returned HTTP {status}: {detail}")
+        self.status = status
+
+
+class SendResult:
+    """What a provider returned for one message.
+
+    tracked is True when delivery updates for the message will be posted
+    to the status callback, so its delivery can be followed in the
+    delivery store.
+    """
+
+    __slots__ = ('provider', 'sid', 'status', 'tracked')
+
+    def __init__(self, provider, sid, status, tracked=False):
+        self.provider = provider
+        self.sid = sid
+        self.status = status
+        self.tracked = tracked
+
+
+class TwilioProvider:
+    """Sends through the process-wide pooled Twilio client."""
+
+    name = 'twilio'
+
+    def __init__(self, account_sid, auth_token, from_number):
+        if not account_sid or not auth_token or not from_number:
+            raise ValueError("Twilio credentials not configured in config.json")
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+
+    def send(self, phone_number, message, status_callback=None):
+        options = {'status_callback': status_callback} if status_callback else {}
+        client = sms_dispatcher.get_twilio_client(self.account_sid, self.auth_token)
+        message_obj = client.messages.create(body=message, from_=self.from_number, to=phone_number, **options)
+        return SendResult(self.name, message_obj.sid, message_obj.status, tracked=bool(status_callback))
+
+
+class D7Provider:
+    """Sends through the D7 Networks Messages API over a pooled requests session.
+
+    D7 reports delivery in its own format, so its messages are not tracked
+    by the Twilio status callback.
+    """
+
+    name = 'd7'
+
+    def __init__(self, api_token, originator=DEFAULT_D7_ORIGINATOR, report_url=None, timeout=DEFAULT_D7_TIMEOUT,
+                 pool_size=8):
+        if not api_token:
+            raise ValueError("D7 SMS API token not configured in config.json")
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.message_globals = {'originator': originator}
+        if report_url:
+            self.message_globals['report_url'] = report_url
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'Authorization': f"Bearer {api_token}",
+        })
+
+    def send(self, phone_number, message, status_callback=None):
+        response = self.session.post(D7_API_URL, timeout=self.timeout, json={
+            'messages': [{
+                'channel': 'sms',
+                'recipients': [phone_number],
+                'content': message,
+                'msg_type': 'text',
+                'data_coding': 'text',
+            }],
+            'message_globals': self.message_globals,
+        })
+        if response.status_code not in (200, 201):
+            raise ProviderError(self.name, response.status_code, response.text[:200])
+        body = response.json()
+        return SendResult(self.name, body.get('request_id', ''), body.get('status', 'accepted'))
+
+
+class FakeProvider:
+    """In-process provider that accepts every message without sending it, for offline load tests.
+
+    latency (seconds) is added to each send, and failure_rate of the sends
+    raise a retryable 503 error, to exercise the dispatcher and failover.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, name='fake', keep=False):
+        self.name = name
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.messages = [] if keep else None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.sent = 0
+
+    def send(self, phone_number, message, status_callback=None):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise ProviderError(self.name, 503, 'simulated failure')
+        with self._lock:
+            sid = f"FK{next(self._ids):032x}"
+            self.sent += 1
+            if self.messages is not None:
+                self.messages.append((phone_number, message))
+        return SendResult(self.name, sid, 'delivered')
+
+
+class _Health:
+    """Moving-average latency and consecutive failures of one provider."""
+
+    __slots__ = ('latency', 'failures', 'down_until', 'last_used')
+
+    def __init__(self):
+        self.latency = None
+        self.failures = 0
+        self.down_until = 0.0
+        self.last_used = 0.0
+
+
+class FailoverProvider:
+    """Sends through the first healthy provider of several, moving traffic away from slow or failing ones.
+
+    Providers are tried in order of preference. One whose moving-average
+    send latency is above slow_seconds is passed over while a faster one is
+    available, and one that fails with a retryable error (rate limiting,
+    5xx, connection problems) failures times in a row is taken out of
+    rotation for cooldown seconds. A message whose provider fails that way
+    is handed to the next provider at once. Other errors, such as an invalid
+    phone number, are raised without trying the others. After cooldown a
+    slow provider's average is forgotten so it is tried again.
+    """
+
+    def __init__(self, providers, slow_seconds=DEFAULT_SLOW_SECONDS, failures=DEFAULT_FAILOVER_FAILURES,
+                 cooldown=DEFAULT_FAILOVER_COOLDOWN):
+        self.providers = list(providers)
+        self.name = '+'.join(provider.name for provider in self.providers)
+        self.slow_seconds = slow_seconds
+        self.failures = failures
+        self.cooldown = cooldown
+        self._health = {provider.name: _Health() for provider in self.providers}
+        self._lock = threading.Lock()
+
+    def order(self):
+        """Return the providers in the order to try them now."""
+        now = time.monotonic()
+        ranked = []
+        with self._lock:
+            for preference, provider in enumerate(self.providers):
+                health = self._health[provider.name]
+                slow = health.latency is not None and health.latency > self.slow_seconds
+                if slow and now - health.last_used > self.cooldown:
+                    health.latency = None
+                    slow = False
+                ranked.append((now < health.down_until, slow, preference, provider))
+        ranked.sort(key=lambda entry: entry[:3])
+        return [provider for _, _, _, provider in ranked]
+
+    def _record(self, provider, latency=None):
+        with self._lock:
+            health = self._health[provider.name]
+            health.last_used = time.monotonic()
+            if latency is None:
+                health.failures += 1
+                if health.failures >= self.failures:
+                    health.down_until = health.last_used + self.cooldown
+                    if health.failures == self.failures:
+                        logging.warning(f"SMS provider {provider.name} failed {health.failures} times in a row, "
+                                        f"moving traffic to the others for {self.cooldown:.0f}s")
+                return
+            health.failures = 0
+            health.down_until = 0.0
+            health.latency = latency if health.latency is None else \
+                (1 - LATENCY_WEIGHT) * health.latency + LATENCY_WEIGHT * latency
+
+    def send(self, phone_number, message, status_callback=None):
+        error = None
+        for provider in self.order():
+            start = time.monotonic()
+            try:
+                result = provider.send(phone_number, message, status_callback)
+            except Exception as e:
+                if not sms_dispatcher.is_retryable(e):
+                    raise
+                self._record(provider)
+                metrics.inc('sms_failovers_total', provider=provider.name)
+                logging.info(f"SMS provider {provider.name} failed, trying the next one: {e}")
+                error = e
+                continue
+            self._record(provider, time.monotonic() - start)
+            return result
+        raise error
+
+    def stats(self):
+        """Return each provider's moving-average latency, consecutive failures and whether it is in rotation."""
+        now = time.monotonic()
+        with self._lock:
+            return {name: {'latency': health.latency, 'failures': health.failures,
+                           'available': now >= health.down_until}
+                    for name, health in self._health.items()}
+
+
+def create_provider(name, config):
+    """Create the provider called name ('twilio', 'd7' or 'fake') from config.json settings."""
+    if name == 'twilio':
+        return TwilioProvider(config.twilio_account_sid, config.twilio_auth_token, config.twilio_phone_number)
+    if name == 'd7':
+        return D7Provider(config.d7_api_token, config.get('D7_ORIGINATOR', DEFAULT_D7_ORIGINATOR),
+                          config.get('D7_REPORT_URL'), pool_size=config.get('SMS_MAX_WORKERS', sms_dispatcher.DEFAULT_MAX_WORKERS))
+    if name == 'fake':
+        return FakeProvider()
+    raise ValueError(f"Unknown SMS provider {name!r} in SMS_PROVIDERS")
+
+
+def get_provider(config):
+    """Return the process-wide provider for the SMS_PROVIDERS setting.
+
+    A single provider is used directly; several are wrapped in a
+    FailoverProvider. Providers are cached per configuration so their
+    connection pools and failover health are kept between runs.
+    """
+    names = tuple(config.get('SMS_PROVIDERS') or DEFAULT_PROVIDERS)
+    key = names + tuple(config.get(key) for key in PROVIDER_KEYS)
+    with _providers_lock:
+        provider = _providers.get(key)
+        if provider is None:
+            providers = [create_provider(name, config) for name in names]
+            if len(providers) == 1:
+                provider = providers[0]
+            else:
+                provider = FailoverProvider(
+                    providers,
+                    slow_seconds=config.get('SMS_FAILOVER_SLOW_SECONDS', DEFAULT_SLOW_SECONDS),
+                    failures=config.get('SMS_FAILOVER_FAILURES', DEFAULT_FAILOVER_FAILURES),
+                    cooldown=config.get('SMS_FAILOVER_COOLDOWN', DEFAULT_FAILOVER_COOLDOWN),
+                )
+            _providers[key] = provider
+        return provider
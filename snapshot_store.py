@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+import datetime
+import hashlib
+import json
+import logging
+import os
+
+# Constants
+DEFAULT_SNAPSHOT_DIR = '.snapshots'  # One file per listing with the events seen on the last run
+
+
+def event_key(event):
+    """Return the key identifying an event across snapshots (its UID, or its dates if it has none)."""
+    return event.uid or f"{event.start.isoformat()}/{event.end.isoformat()}"
+
+
+def to_rows(events):
+    """Convert events into compact (key, start, end, summary) rows sorted by key."""
+    return sorted((event_key(event), event.start.isoformat(), event.end.isoformat(), event.summary)
+                  for event in events)
+
+
+class SnapshotDiff:
+    """Events added, removed and modified between two snapshots.
+
+    Rows are (key, start, end, summary) tuples with ISO dates; modified holds
+    (old_row, new_row) pairs.
+    """
+
+    __slots__ = ('added', 'removed', 'modified', 'initial')
+
+    def __init__(self, initial=False):
+        self.added = []
+        self.removed = []
+        self.modified = []
+        self.initial = initial
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.modified)
+
+    def summary(self):
+        return f"{len(self.added)} added, {len(self.removed)} removed, {len(self.modified)} modified"
+
+
+def diff_rows(old_rows, new_rows):
+    """Diff two key-sorted row lists in a single merge pass."""
+    diff = SnapshotDiff()
+    i = j = 0
+    while i < len(old_rows) and j < len(new_rows):
+        old, new = old_rows[i], new_rows[j]
+        if old[0] == new[0]:
+            if old != new:
+                diff.modified.append((old, new))
+            i += 1
+            j += 1
+        elif old[0] < new[0]:
+            diff.removed.append(old)
+            i += 1
+        else:
+            diff.added.append(new)
+            j += 1
+    diff.removed.extend(old_rows[i:])
+    diff.added.extend(new_rows[j:])
+    return diff
+
+
+def row_date(value):
+    """Parse an ISO date stored in a row."""
+    return datetime.date.fromisoformat(value)
+
+
+class SnapshotStore:
+    """Persists the last seen events of each listing and reports what changed since."""
+
+    def __init__(self, directory=DEFAULT_SNAPSHOT_DIR):
+        self.directory = directory
+
+    def _path(self, listing_key):
+        name = hashlib.sha1(listing_key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{name}.json")
+
+    def has_snapshot(self, listing_key):
+        """True if the listing has a snapshot that is up to date with the feed it was taken from."""
+        path = self._path(listing_key)
+        return os.path.exists(path) and not os.path.exists(path + '.stale')
+
+    def mark_stale(self, listing_key):
+        """Record that the feed has changes not saved yet, so they are diffed again even if it is unchanged."""
+        os.makedirs(self.directory, exist_ok=True)
+        open(self._path(listing_key) + '.stale', 'w').close()
+
+    def load(self, listing_key):
+        """Return the stored rows for a listing, or None if it has never been snapshotted."""
+        try:
+            with open(self._path(listing_key), 'r') as f:
+                return [tuple(row) for row in json.load(f)]
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.error(f"Error loading snapshot for {listing_key}, treating as new: {e}")
+            return None
+
+    def save(self, listing_key, rows):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(listing_key)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(rows, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        try:
+            os.remove(path + '.stale')
+        except FileNotFoundError:
+            pass
+
+    def update(self, listing_key, events, persist=True):
+        """Replace a listing's snapshot with events and return the SnapshotDiff.
+
+        The first snapshot of a listing is returned with initial=True and
+        every event in added. The file is only rewritten when something
+        changed; with persist=False it is left alone and only the diff is
+        computed, e.g. until the changes have been notified.
+        """
+        new_rows = to_rows(events)
+        old_rows = self.load(listing_key)
+        if old_rows is None:
+            diff = SnapshotDiff(initial=True)
+            diff.added = new_rows
+        else:
+            diff = diff_rows(old_rows, new_rows)
+        if persist and (diff or old_rows is None or os.path.exists(self._path(listing_key) + '.stale')):
+            self.save(listing_key, new_rows)
+        return diff
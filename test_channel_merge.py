@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+import datetime
+
+import channel_merge
+import event_index
+
+
+def day(n):
+    return datetime.date(2025, 3, n)
+
+
+# Airbnb's export of the dates booked on VRBO, and the two VRBO bookings behind it
+AIRBNB = [event_index.Event(day(3), day(10), 'block@airbnb.com', 'Airbnb (Not available)')]
+VRBO = [
+    event_index.Event(day(3), day(6), 'first@vrbo.com', 'Reserved'),
+    event_index.Event(day(6), day(10), 'second@vrbo.com', 'Reserved'),
+]
+
+
+def test_block_over_back_to_back_reservations_keeps_both_checkouts():
+    for timelines in ([AIRBNB, VRBO], [VRBO, AIRBNB]):
+        events, conflicts = channel_merge.merge_timelines(timelines)
+        assert [(event.start, event.end) for event in events] == [(day(3), day(6)), (day(6), day(10))]
+        assert [event.uid for event in events] == ['first@vrbo.com', 'second@vrbo.com']
+        assert conflicts == []
+
+
+def test_block_is_clipped_to_the_dates_no_reservation_covers():
+    airbnb = [event_index.Event(day(1), day(12), 'block@airbnb.com', 'Airbnb (Not available)')]
+    booking = [event_index.Event(day(4), day(8), 'stay@booking.com', 'CLOSED - Not available')]
+    for timelines in ([airbnb, booking], [booking, airbnb]):
+        events, _ = channel_merge.merge_timelines(timelines)
+        assert [(event.start, event.end, event.summary) for event in events] == [
+            (day(1), day(4), 'Airbnb (Not available)'),
+            (day(4), day(8), 'CLOSED - Not available'),
+            (day(8), day(12), 'Airbnb (Not available)'),
+        ]
+        assert len({event.uid for event in events}) == 3
+
+
+def test_overlapping_reservations_are_one_stay_and_a_conflict():
+    airbnb = [event_index.Event(day(3), day(7), 'stay@airbnb.com', 'Reserved')]
+    vrbo = [event_index.Event(day(5), day(9), 'stay@vrbo.com', 'Reserved')]
+    events, conflicts = channel_merge.merge_timelines([airbnb, vrbo])
+    assert [(event.start, event.end, event.uid) for event in events] == [(day(3), day(9), 'stay@airbnb.com')]
+    assert [(first.uid, second.uid) for first, second in conflicts] == [('stay@airbnb.com', 'stay@vrbo.com')]
+
+
+if __name__ == "__main__":
+    test_block_over_back_to_back_reservations_keeps_both_checkouts()
+    test_block_is_clipped_to_the_dates_no_reservation_covers()
+    test_overlapping_reservations_are_one_stay_and_a_conflict()
+    print("All channel merge tests passed.")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+import datetime
+
+import airbnb_cleaner_notification
+import cleaner_routing
+import notification_ledger
+import planner
+import replay
+import settings
+
+# One stay checking out on March 10
+FEED = '''BEGIN:VCALENDAR
+VERSION:2.0
+BEGIN:VEVENT
+DTSTART;VALUE=DATE:20250305
+DTEND;VALUE=DATE:20250310
+SUMMARY:Reserved
+UID:stay-1@airbnb.com
+END:VEVENT
+END:VCALENDAR
+'''
+
+
+def run_day(config, day):
+    """Return the messages the reminder check sends on day, as (phone, message) pairs."""
+    listings = airbnb_cleaner_notification.get_listings(config)
+    recordings = {listing['NAME']: replay.Recording.from_text(FEED, name=listing['NAME']) for listing in listings}
+    sink = replay.NullSink(keep=True)
+    replay.replay(config, listings, recordings, day, day, sink=sink)
+    return sink.messages
+
+
+def test_listings_in_one_area_keep_their_own_cleaner():
+    config = settings.Settings({
+        'TIMEZONE': 'UTC',
+        'LISTINGS': [
+            {'NAME': 'Loft', 'PROPERTY_LOCATION': 'Loft', 'AREA': 'Downtown', 'CLEANER_PHONE': '+15550000001',
+             'ICAL_URL': 'https://example.invalid/loft.ics'},
+            {'NAME': 'Studio', 'PROPERTY_LOCATION': 'Studio', 'AREA': 'Downtown', 'CLEANER_PHONE': '+15550000002',
+             'ICAL_URL': 'https://example.invalid/studio.ics'},
+        ],
+    })
+    messages = dict(run_day(config, datetime.date(2025, 3, 9)))
+    assert sorted(messages) == ['+15550000001', '+15550000002']
+    assert 'Loft' in messages['+15550000001'] and 'Studio' not in messages['+15550000001']
+    assert 'Studio' in messages['+15550000002'] and 'Loft' not in messages['+15550000002']
+
+
+def test_cleaner_with_several_listings_gets_one_message():
+    config = settings.Settings({
+        'TIMEZONE': 'UTC',
+        'LISTINGS': [
+            {'NAME': 'Loft', 'PROPERTY_LOCATION': 'Loft', 'AREA': 'Downtown', 'CLEANER_PHONE': '+15550000001',
+             'ICAL_URL': 'https://example.invalid/loft.ics'},
+            {'NAME': 'Cabin', 'PROPERTY_LOCATION': 'Cabin', 'AREA': 'Lakeside', 'CLEANER_PHONE': '+15550000001',
+             'ICAL_URL': 'https://example.invalid/cabin.ics'},
+        ],
+    })
+    messages = run_day(config, datetime.date(2025, 3, 9))
+    assert len(messages) == 1
+    phone, message = messages[0]
+    assert phone == '+15550000001' and 'Loft' in message and 'Cabin' in message
+
+
+def test_earlier_reminders_count_against_capacity(tmp_path):
+    checkout = datetime.date(2025, 3, 10)
+    ledger = notification_ledger.NotificationLedger(str(tmp_path / 'ledger.jsonl'))
+    key = ledger.make_key('Loft', checkout, '+15550000001')
+    ledger.claim(key)
+    ledger.record(key, True)
+    config = settings.Settings({
+        'CLEANERS': [{'NAME': 'Alice', 'PHONE': '+15550000001', 'CAPACITY': 2},
+                     {'NAME': 'Bob', 'PHONE': '+15550000002', 'CAPACITY': 1}],
+    })
+    listings = [{'NAME': name, 'AREA': 'Downtown'} for name in ('Loft', 'Cabin', 'Studio')]
+    # A later run at another NOTIFY_TIME, and a rerun of the Loft
+    turnovers = [planner.Turnover(name, name, '', checkout, None) for name in ('Cabin', 'Studio', 'Loft')]
+    cleaners, unassigned = cleaner_routing.route(config, listings, turnovers, ledger.reminded)
+    ledger.close()
+    jobs = {cleaner.name: [turnover.listing for turnover in cleaner.jobs] for cleaner in cleaners}
+    assert unassigned == []
+    assert sorted(jobs['Alice']) == ['Cabin', 'Loft']
+    assert jobs['Bob'] == ['Studio']
+
+
+if __name__ == "__main__":
+    test_listings_in_one_area_keep_their_own_cleaner()
+    test_cleaner_with_several_listings_gets_one_message()
+    import pathlib
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        test_earlier_reminders_count_against_capacity(pathlib.Path(directory))
+    print("All routing tests passed.")
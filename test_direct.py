@@ -1,91 +1,9 @@
 #!/usr/bin/env python
-import sys
 import datetime
-import json
-import requests
-import icalendar
-from unittest.mock import patch
 
-# Create a simplified version of our check_checkout_tomorrow function for testing
-def test_checkout_logic(today_date, ical_data):
-    """Test the checkout logic with a specific date and iCal data"""
-    print(f"Testing with today's date: {today_date.isoformat()}")
-    tomorrow = today_date + datetime.timedelta(days=1)
-    print(f"Checking for events ending tomorrow: {tomorrow.isoformat()}")
-    
-    # Parse the iCal data
-    calendar = icalendar.Calendar.from_ical(ical_data)
-    
-    # Process all events
-    checkout_events = []
-    all_events = []
-    
-    # First collect all events
-    print("\nAll events in calendar:")
-    for component in calendar.walk():
-        if component.name == "VEVENT":
-            summary = str(component.get('SUMMARY', 'No Title'))
-            start_date = component.get('DTSTART').dt
-            end_date = component.get('DTEND').dt
-            
-            # Convert to date if datetime
-            if isinstance(start_date, datetime.datetime):
-                start_date = start_date.date()
-            if isinstance(end_date, datetime.datetime):
-                end_date = end_date.date()
-            
-            # Store event info
-            event_info = {
-                'summary': summary,
-                'start': start_date,
-                'end': end_date
-            }
-            all_events.append(event_info)
-            
-            # Print all events
-            print(f"Event: {summary}, Start: {start_date}, End: {end_date}")
-            
-            # Check if this event ends tomorrow (checkout)
-            if end_date == tomorrow and 'reserved' in summary.lower():
-                checkout_events.append(event_info)
-                print(f"  --> Found event ending tomorrow: {summary}, Start: {start_date}, End: {end_date}")
-    
-    # If we found events ending tomorrow, prepare notification
-    if checkout_events:
-        # Look for upcoming events starting in the next 3 days
-        next_checkin = None
-        three_days_later = tomorrow + datetime.timedelta(days=3)
-        
-        for event in all_events:
-            # Only consider 'Reserved' events
-            if 'reserved' not in event['summary'].lower():
-                continue
-            
-            # Check if this is a future check-in within the next 3 days
-            if (event['start'] >= tomorrow and 
-                event['start'] <= three_days_later):
-                
-                # If we haven't found a check-in yet, or this one is earlier
-                if next_checkin is None or event['start'] < next_checkin['start']:
-                    next_checkin = event
-        
-        # Prepare the message
-        message = f"Cleaning needed tomorrow ({tomorrow.strftime('%A, %B %d, %Y')}) at Austin Bell Unit 310."
-        
-        # Add next check-in information if found
-        if next_checkin:
-            days_until = (next_checkin['start'] - tomorrow).days
-            
-            if days_until == 1:
-                message += f" Next check-in is the day after tomorrow ({next_checkin['start'].strftime('%A, %B %d')})."
-            else:
-                message += f" Next check-in is on {next_checkin['start'].strftime('%A, %B %d')}."
-        else:
-            message += " No upcoming check-ins in the next 3 days."
-        
-        print(f"Would send SMS: {message}")
-    else:
-        print(f"No events ending tomorrow ({tomorrow.isoformat()}) at Austin Bell Unit 310")
+import airbnb_cleaner_notification
+import replay
+import settings
 
 # Real iCal data from Airbnb
 mock_ical_data = '''BEGIN:VCALENDAR
@@ -155,10 +73,30 @@ test_dates = [
     datetime.date(2025, 3, 14),  # Testing for March 15 checkout (found)
 ]
 
-# Run tests for each date
+# Replay the real evaluation over the test dates, capturing messages instead of sending them
+config = settings.Settings({
+    'PROPERTY_LOCATION': 'Austin Bell Unit 310',
+    'CLEANER_PHONE': '+15555555555',
+    'TIMEZONE': 'America/Chicago',
+    'ICAL_URL': 'https://www.airbnb.com/calendar/ical/test.ics',
+})
+listings = airbnb_cleaner_notification.get_listings(config)
+recordings = {listing['NAME']: replay.Recording.from_text(mock_ical_data) for listing in listings}
+
+print("All events in calendar:")
+for event in recordings[listings[0]['NAME']].index_on(test_dates[0]).by_start:
+    print(f"Event: {event.summary}, Start: {event.start}, End: {event.end}")
+
 for test_date in test_dates:
     print(f"\n===== TESTING FOR {test_date.strftime('%A, %B %d, %Y')} =====\n")
-    test_checkout_logic(test_date, mock_ical_data)
+    sink = replay.NullSink(keep=True)
+    replay.replay(config, listings, recordings, test_date, test_date, sink=sink)
+    tomorrow = test_date + datetime.timedelta(days=1)
+    if sink.messages:
+        for phone_number, message in sink.messages:
+            print(f"Would send SMS to {phone_number}: {message}")
+    else:
+        print(f"No events ending tomorrow ({tomorrow.isoformat()}) at Austin Bell Unit 310")
     print("\n===== END TEST =====\n")
 
 print("All tests complete. This shows what the notification messages would be for each date.")